@@ -0,0 +1,437 @@
+"""Локальный эмулятор Google Sheets, Drive и Calendar для нагрузочных тестов
+
+Запуск:
+
+    python -m bench.emulator --port 8085 --rows 1000 --latency 0.05 --rate-429 0.02
+
+и в окружении приложения GOOGLE_EMULATOR_URL=http://127.0.0.1:8085 — тогда
+shared.google_clients обращается к эмулятору вместо Google (анонимно).
+
+Поддерживаются:
+    GET  /v4/spreadsheets/{id}                       метаданные и список листов
+    GET  /v4/spreadsheets/{id}/values:batchGet        несколько диапазонов A1
+    GET  /v4/spreadsheets/{id}/values/{range}         один диапазон
+    GET  /drive/v3/files/{id}                         modifiedTime таблицы
+    GET|POST /calendar/v3/calendars/{cal}/events      list (страницы, окно) и insert
+    GET|PUT|PATCH|DELETE .../events/{id}              с проверкой If-Match (412)
+    POST /batch/calendar/v3                           multipart/mixed batch
+    GET  /_emulator/stats, POST /_emulator/config     счетчики и смена параметров на лету
+
+Задержка добавляется к каждому HTTP-запросу (batch — один раз), ошибки
+403 rateLimitExceeded, 429 (с Retry-After) и 503 выдаются с заданными
+вероятностями — в batch независимо для каждой части.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+EVENT_ID_RE = re.compile(r'^[a-v0-9]{5,1024}$')
+A1_RE = re.compile(r"^(?:'?(?P<title>(?:[^']|'')+?)'?!)?(?P<c1>[A-Z]+)(?P<r1>\d*)(?::(?P<c2>[A-Z]+)(?P<r2>\d*))?$")
+
+def column_index(letters: str) -> int:
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index - 1
+
+def parse_time(value: str):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class EmulatorState:
+    """Состояние эмулятора: таблица, календари, параметры отказов и счетчики"""
+
+    def __init__(self, rows: int = 100, spreadsheet_id: str = 'emulated',
+                 latency: float = 0.0, rate_403: float = 0.0, rate_429: float = 0.0, rate_5xx: float = 0.0,
+                 retry_after: float = 1.0):
+        self.lock = threading.Lock()
+        self.config = {
+            'latency': latency, 'rate_403': rate_403, 'rate_429': rate_429, 'rate_5xx': rate_5xx,
+            'retry_after': retry_after
+        }
+        self.stats = Counter()
+        self.spreadsheet_id = spreadsheet_id
+        self.sheets = []
+        self.modified_time = datetime.now(timezone.utc).isoformat()
+        self.calendars = {}
+        self.etag = 0
+        self.add_week_sheet(rows)
+
+    def add_week_sheet(self, rows: int) -> None:
+        """Добавляет лист следующей недели с синтетическими сменами"""
+        from bench.fakes import synthetic_rows
+        today = datetime.now()
+        monday = (today - timedelta(days=today.weekday()) + timedelta(weeks=1)).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        title = f"{monday.day}-{(monday + timedelta(days=6)).day}"
+        grid = [['Сотрудник', 'Начало', 'Конец', 'Описание']] + synthetic_rows(rows, monday)
+        with self.lock:
+            self.sheets.append({'sheetId': len(self.sheets), 'title': title, 'grid': grid})
+            self.modified_time = datetime.now(timezone.utc).isoformat()
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+    def next_etag(self) -> str:
+        with self.lock:
+            self.etag += 1
+            return f'"{self.etag}"'
+
+    def fault(self):
+        """Случайная ошибка по настроенным вероятностям: (статус, тело, заголовки) или None"""
+        with self.lock:
+            config = dict(self.config)
+        roll = random.random()
+        if roll < config['rate_429']:
+            self.count('fault_429')
+            return 429, error_body(429, 'rateLimitExceeded', 'Rate Limit Exceeded', 'RESOURCE_EXHAUSTED'), {
+                'Retry-After': str(config['retry_after'])
+            }
+        roll -= config['rate_429']
+        if roll < config['rate_403']:
+            self.count('fault_403')
+            return 403, error_body(403, 'rateLimitExceeded', 'Rate Limit Exceeded', 'PERMISSION_DENIED'), {}
+        roll -= config['rate_403']
+        if roll < config['rate_5xx']:
+            self.count('fault_503')
+            return 503, error_body(503, 'backendError', 'Backend Error', 'UNAVAILABLE'), {}
+        return None
+
+    def sleep(self) -> None:
+        latency = self.config['latency']
+        if latency:
+            time.sleep(latency * random.uniform(0.5, 1.5))
+
+def error_body(code: int, reason: str, message: str, status: str = '') -> dict:
+    return {'error': {'code': code, 'message': message, 'status': status,
+                      'errors': [{'domain': 'global', 'reason': reason, 'message': message}]}}
+
+class Api:
+    """Обработка одного запроса API без транспорта: (статус, тело, заголовки)"""
+
+    def __init__(self, state: EmulatorState):
+        self.state = state
+
+    def dispatch(self, method: str, path: str, query: dict, headers, body: bytes):
+        path = unquote(path)
+        if path.startswith('/v4/spreadsheets/'):
+            return self.sheets(method, path[len('/v4/spreadsheets/'):], query)
+        if path.startswith('/drive/v3/files/'):
+            return self.drive(path[len('/drive/v3/files/'):])
+        if path.startswith('/calendar/v3/calendars/'):
+            return self.calendar(method, path[len('/calendar/v3/calendars/'):], query, headers, body)
+        return 404, error_body(404, 'notFound', f'Unknown path {path}'), {}
+
+    # --- Sheets / Drive ---
+
+    def _sheet(self, title: str):
+        for sheet in self.state.sheets:
+            if title is None or sheet['title'] == title:
+                return sheet
+        return None
+
+    def _value_range(self, a1: str) -> dict:
+        match = A1_RE.match(a1)
+        if not match:
+            raise ValueError(a1)
+        title = match.group('title').replace("''", "'") if match.group('title') else None
+        sheet = self._sheet(title)
+        if sheet is None:
+            raise LookupError(title)
+        c1, c2 = column_index(match.group('c1')), column_index(match.group('c2') or match.group('c1'))
+        r1 = int(match.group('r1') or 1) - 1
+        r2 = int(match.group('r2')) if match.group('r2') else len(sheet['grid'])
+        values = []
+        for row in sheet['grid'][r1:r2]:
+            cells = [str(cell) for cell in row[c1:c2 + 1]]
+            while cells and cells[-1] == '':
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        result = {'range': a1, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def sheets(self, method: str, rest: str, query: dict):
+        spreadsheet_id, _, tail = rest.partition('/')
+        if spreadsheet_id.endswith(':batchUpdate') or method != 'GET':
+            return 405, error_body(405, 'notSupported', 'Only reads are emulated'), {}
+        if spreadsheet_id != self.state.spreadsheet_id:
+            return 404, error_body(404, 'notFound', 'Requested entity was not found.', 'NOT_FOUND'), {}
+        try:
+            if tail == 'values:batchGet':
+                self.state.count('sheets.values.batchGet')
+                return 200, {'spreadsheetId': spreadsheet_id,
+                             'valueRanges': [self._value_range(a1) for a1 in query.get('ranges', [])]}, {}
+            if tail.startswith('values/'):
+                self.state.count('sheets.values.get')
+                return 200, self._value_range(tail[len('values/'):]), {}
+        except (ValueError, LookupError) as e:
+            return 400, error_body(400, 'badRequest', f'Unable to parse range: {e}', 'INVALID_ARGUMENT'), {}
+        if tail:
+            return 404, error_body(404, 'notFound', f'Unknown path {tail}'), {}
+
+        self.state.count('sheets.spreadsheets.get')
+        return 200, {
+            'spreadsheetId': spreadsheet_id,
+            'properties': {'title': 'Barhub emulator', 'locale': 'ru_RU', 'timeZone': 'Asia/Yekaterinburg'},
+            'sheets': [{'properties': {
+                'sheetId': sheet['sheetId'], 'title': sheet['title'], 'index': index, 'sheetType': 'GRID',
+                'gridProperties': {'rowCount': max(1000, len(sheet['grid'])), 'columnCount': 26}
+            }} for index, sheet in enumerate(self.state.sheets)]
+        }, {}
+
+    def drive(self, file_id: str):
+        self.state.count('drive.files.get')
+        if file_id != self.state.spreadsheet_id:
+            return 404, error_body(404, 'notFound', f'File not found: {file_id}'), {}
+        return 200, {'id': file_id, 'name': 'Barhub emulator', 'createdTime': self.state.modified_time,
+                     'modifiedTime': self.state.modified_time}, {}
+
+    # --- Calendar ---
+
+    def calendar(self, method: str, rest: str, query: dict, headers, body: bytes):
+        parts = rest.split('/')
+        if len(parts) < 2 or parts[1] != 'events':
+            return 404, error_body(404, 'notFound', 'Not Found'), {}
+        calendar_id = parts[0]
+        with self.state.lock:
+            events = self.state.calendars.setdefault(calendar_id, {})
+        payload = json.loads(body or b'{}') if method in ('POST', 'PUT', 'PATCH') else None
+
+        if len(parts) == 2:
+            if method == 'GET':
+                return self.list_events(events, query)
+            if method == 'POST':
+                return self.insert_event(events, payload)
+        elif len(parts) == 3:
+            event_id = parts[2]
+            if method == 'GET':
+                self.state.count('calendar.events.get')
+                event = events.get(event_id)
+                return (200, event, {}) if event else (404, error_body(404, 'notFound', 'Not Found'), {})
+            if method in ('PUT', 'PATCH'):
+                return self.update_event(events, event_id, payload, headers, patch=method == 'PATCH')
+            if method == 'DELETE':
+                return self.delete_event(events, event_id)
+        return 405, error_body(405, 'notSupported', 'Method not supported'), {}
+
+    def list_events(self, events: dict, query: dict):
+        self.state.count('calendar.events.list')
+        time_min = parse_time(query.get('timeMin', [None])[0])
+        time_max = parse_time(query.get('timeMax', [None])[0])
+        show_deleted = query.get('showDeleted', ['false'])[0] == 'true'
+        text = query.get('q', [None])[0]
+        max_results = min(int(query.get('maxResults', ['250'])[0]), 2500)
+        offset = int(query.get('pageToken', ['0'])[0] or 0)
+
+        with self.state.lock:
+            items = sorted(events.values(), key=lambda e: (e['start'].get('dateTime', ''), e['id']))
+        selected = []
+        for event in items:
+            if event.get('status') == 'cancelled' and not show_deleted:
+                continue
+            start, end = parse_time(event['start'].get('dateTime')), parse_time(event['end'].get('dateTime'))
+            if time_min and end and end <= time_min or time_max and start and start >= time_max:
+                continue
+            if text and text not in event.get('summary', ''):
+                continue
+            selected.append(event)
+
+        result = {'kind': 'calendar#events', 'items': selected[offset:offset + max_results]}
+        if offset + max_results < len(selected):
+            result['nextPageToken'] = str(offset + max_results)
+        return 200, result, {}
+
+    def insert_event(self, events: dict, payload: dict):
+        self.state.count('calendar.events.insert')
+        event_id = payload.get('id') or f'{random.getrandbits(80):020x}'
+        if not EVENT_ID_RE.match(event_id):
+            return 400, error_body(400, 'invalid', 'Invalid resource id value.'), {}
+        with self.state.lock:
+            if event_id in events:
+                return 409, error_body(409, 'duplicate', 'The requested identifier already exists.'), {}
+            event = {**payload, 'id': event_id, 'status': 'confirmed', 'kind': 'calendar#event'}
+            events[event_id] = event
+        event['etag'] = self.state.next_etag()
+        return 200, event, {}
+
+    def update_event(self, events: dict, event_id: str, payload: dict, headers, patch: bool):
+        self.state.count('calendar.events.update')
+        with self.state.lock:
+            current = events.get(event_id)
+            if current is None:
+                return 404, error_body(404, 'notFound', 'Not Found'), {}
+            expected = headers.get('If-Match')
+            if expected and expected != current['etag']:
+                return 412, error_body(412, 'conditionNotMet', 'Precondition Failed'), {}
+            base = current if patch else {}
+            events[event_id] = event = {**base, **payload, 'id': event_id, 'kind': 'calendar#event',
+                                        'status': payload.get('status', 'confirmed')}
+        event['etag'] = self.state.next_etag()
+        return 200, event, {}
+
+    def delete_event(self, events: dict, event_id: str):
+        self.state.count('calendar.events.delete')
+        with self.state.lock:
+            current = events.get(event_id)
+            if current is None or current.get('status') == 'cancelled':
+                return 410, error_body(410, 'deleted', 'Resource has been deleted'), {}
+            current['status'] = 'cancelled'
+        return 204, None, {}
+
+def split_batch(content_type: str, body: bytes) -> list:
+    """Разбирает multipart/mixed batch на (Content-ID, метод, путь, заголовки, тело)"""
+    message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    requests = []
+    for part in message.iter_parts():
+        raw = part.get_payload(decode=True) or part.get_payload().encode('utf-8')
+        head, _, payload = raw.replace(b'\r\n', b'\n').partition(b'\n\n')
+        lines = head.decode('utf-8').split('\n')
+        method, target, _ = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip()] = value.strip()
+        requests.append((part['Content-ID'], method, target, headers, payload.strip()))
+    return requests
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: EmulatorState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload, headers: dict = None, content_type: str = 'application/json; charset=UTF-8'):
+        body = payload if isinstance(payload, bytes) else (b'' if payload is None else json.dumps(payload).encode())
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if url.path.startswith('/_emulator/'):
+            return self._control(method, url.path, body)
+
+        self.state.count('http_requests')
+        self.state.sleep()
+        if url.path == '/batch/calendar/v3' and method == 'POST':
+            return self._batch(body)
+
+        fault = self.state.fault()
+        if fault:
+            return self._send(*fault)
+        api = Api(self.state)
+        status, payload, headers = api.dispatch(method, url.path, parse_qs(url.query), self.headers, body)
+        self._send(status, payload, headers)
+
+    def _batch(self, body: bytes):
+        self.state.count('calendar.batch')
+        api = Api(self.state)
+        boundary = f'batch_{random.getrandbits(64):x}'
+        parts = []
+        for content_id, method, target, headers, payload in split_batch(self.headers['Content-Type'], body):
+            url = urlparse(target)
+            fault = self.state.fault()
+            status, result, extra = fault or api.dispatch(method, url.path, parse_qs(url.query), headers, payload)
+            text = '' if result is None else json.dumps(result)
+            response_headers = ''.join(f'{name}: {value}\r\n' for name, value in extra.items())
+            inner = content_id.strip('<>')
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{inner}>\r\n\r\n'
+                f'HTTP/1.1 {status} {self.responses.get(status, ("",))[0]}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n{response_headers}'
+                f'Content-Length: {len(text.encode())}\r\n\r\n{text}\r\n'
+            )
+        payload = (''.join(parts) + f'--{boundary}--\r\n').encode('utf-8')
+        self._send(200, payload, content_type=f'multipart/mixed; boundary={boundary}')
+
+    def _control(self, method: str, path: str, body: bytes):
+        if path == '/_emulator/stats':
+            with self.state.lock:
+                stats = dict(self.state.stats)
+                events = {cal: len(items) for cal, items in self.state.calendars.items()}
+            return self._send(200, {'stats': stats, 'events': events, 'config': self.state.config})
+        if path == '/_emulator/config' and method == 'POST':
+            updates = json.loads(body or b'{}')
+            with self.state.lock:
+                self.state.config.update({k: float(v) for k, v in updates.items() if k in self.state.config})
+            return self._send(200, self.state.config)
+        if path == '/_emulator/reset' and method == 'POST':
+            with self.state.lock:
+                self.state.calendars.clear()
+                self.state.stats.clear()
+            return self._send(200, {'status': 'ok'})
+        self._send(404, error_body(404, 'notFound', 'Unknown control path'))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+def make_server(state: EmulatorState, host: str = '127.0.0.1', port: int = 8085) -> ThreadingHTTPServer:
+    handler = type('BoundEmulatorHandler', (EmulatorHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Эмулятор Google Sheets/Calendar')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--spreadsheet-id', default='1d8dCGCC7Gx0MQnPAWVr9ny9jOg9Tq5yQOro8yh3aZms')
+    parser.add_argument('--latency', type=float, default=0.0, help='средняя задержка запроса, с')
+    parser.add_argument('--rate-403', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-5xx', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    state = EmulatorState(rows=args.rows, spreadsheet_id=args.spreadsheet_id, latency=args.latency,
+                          rate_403=args.rate_403, rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+                          retry_after=args.retry_after)
+    server = make_server(state, args.host, args.port)
+    print(f"Эмулятор Google API: http://{args.host}:{args.port} (строк {args.rows})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Имитации клиентов Google Sheets и Calendar для офлайн-бенчмарков
+
+Клиенты хранят данные в памяти, добавляют задержку к каждому запросу
+(batch-запрос Calendar стоит одну задержку) и считают вызовы по методам.
+"""
+import time
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import httplib2
+from googleapiclient.errors import HttpError
+
+class ApiStats:
+    """Счетчик вызовов API по методам"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def hit(self, method: str, count: int = 1):
+        with self._lock:
+            self.calls[method] += count
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+def _sleep(latency: float):
+    if latency:
+        time.sleep(latency)
+
+def make_http_error(status: int, reason: str = '') -> HttpError:
+    resp = httplib2.Response({'status': status})
+    resp.reason = reason
+    return HttpError(resp, f'{{"error": {{"code": {status}, "message": "{reason}"}}}}'.encode('utf-8'))
+
+# --- Sheets ---
+
+def synthetic_rows(count: int, monday: datetime) -> list:
+    """Строки листа A2:D: одна смена на сотрудника в день, count строк за неделю
+
+    Начало и конец смены — дата и время в формате, который ожидает
+    parse_shift_times; описание пустое. Заведение в ячейку не пишется, поэтому
+    все смены попадают в календарь по умолчанию.
+    """
+    rows = []
+    for index in range(count):
+        day = monday + timedelta(days=index % 7)
+        start = day.replace(hour=18, minute=0, second=0, microsecond=0)
+        end = start + timedelta(hours=8)
+        rows.append([
+            f"Сотрудник {index // 7:05d}",
+            start.strftime('%Y-%m-%d %H:%M:%S'),
+            end.strftime('%Y-%m-%d %H:%M:%S'),
+            ''
+        ])
+    return rows
+
+class FakeWorksheet:
+    def __init__(self, title: str, monday: datetime, rows: list, stats: ApiStats, latency: float):
+        self.title = title
+        self.rows = rows
+        self.header = [[str((monday + timedelta(days=i)).day) for i in range(7)]]
+        self.stats = stats
+        self.latency = latency
+
+    def batch_get(self, ranges: list):
+        self.stats.hit('sheets.values.batchGet')
+        _sleep(self.latency)
+        result = []
+        for cell_range in ranges:
+            result.append(self.header if cell_range.startswith('C2') else [list(row) for row in self.rows])
+        return result
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets: list, stats: ApiStats, latency: float):
+        self.title = 'bench'
+        self._worksheets = worksheets
+        self.stats = stats
+        self.latency = latency
+        self.modified = datetime.now().isoformat()
+
+    def worksheets(self):
+        self.stats.hit('sheets.spreadsheets.get')
+        _sleep(self.latency)
+        return list(self._worksheets)
+
+    def get_lastUpdateTime(self):
+        self.stats.hit('drive.files.get')
+        _sleep(self.latency)
+        return self.modified
+
+def make_sheets_session(rows: int, stats: ApiStats, latency: float) -> dict:
+    """Сессия в формате google_clients.get_sheets_session с листом следующей недели"""
+    today = datetime.now()
+    monday = (today - timedelta(days=today.weekday()) + timedelta(weeks=1)).replace(hour=0, minute=0, second=0,
+                                                                                  microsecond=0)
+    sunday = monday + timedelta(days=6)
+    worksheet = FakeWorksheet(f"{monday.day}-{sunday.day}", monday, synthetic_rows(rows, monday), stats, latency)
+    spreadsheet = FakeSpreadsheet([worksheet], stats, latency)
+    return {
+        'creds': None,
+        'client': None,
+        'spreadsheet': spreadsheet,
+        'worksheets': [worksheet],
+        'loaded_at': time.monotonic(),
+        'modified_time': None,
+        'generation': 0
+    }
+
+# --- Calendar ---
+
+class FakeRequest:
+    def __init__(self, service, method: str, func):
+        self.service = service
+        self.methodId = f'calendar.{method}'
+        self.func = func
+        self.headers = {}
+
+    def execute(self):
+        self.service.stats.hit(self.methodId)
+        _sleep(self.service.latency)
+        return self.func()
+
+    def run_in_batch(self):
+        self.service.stats.hit(self.methodId)
+        return self.func()
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.stats.hit('calendar.batch')
+        _sleep(self.service.latency)
+        for request_id, request in self.requests:
+            try:
+                response, error = request.run_in_batch(), None
+            except HttpError as e:
+                response, error = None, e
+            self.callback(request_id, response, error)
+
+class FakeEvents:
+    def __init__(self, service):
+        self.service = service
+
+    def _event(self, event_id: str, body: dict) -> dict:
+        self.service.etag_counter += 1
+        return {**body, 'id': event_id, 'etag': f'"{self.service.etag_counter}"', 'status': 'confirmed'}
+
+    def list(self, calendarId=None, pageToken=None, maxResults=250, **kwargs):
+        def run():
+            items = sorted(self.service.calendars.get(calendarId, {}).values(), key=lambda e: e['id'])
+            offset = int(pageToken or 0)
+            page = items[offset:offset + maxResults]
+            result = {'items': page}
+            if offset + maxResults < len(items):
+                result['nextPageToken'] = str(offset + maxResults)
+            return result
+        return FakeRequest(self.service, 'events.list', run)
+
+    def insert(self, calendarId=None, body=None, **kwargs):
+        def run():
+            events = self.service.calendars.setdefault(calendarId, {})
+            event_id = body.get('id') or f'ev{random.getrandbits(64):x}'
+            if event_id in events:
+                raise make_http_error(409, 'duplicate')
+            events[event_id] = self._event(event_id, body)
+            return events[event_id]
+        return FakeRequest(self.service, 'events.insert', run)
+
+    def update(self, calendarId=None, eventId=None, body=None, **kwargs):
+        def run():
+            events = self.service.calendars.setdefault(calendarId, {})
+            if eventId not in events:
+                raise make_http_error(404, 'notFound')
+            events[eventId] = self._event(eventId, body)
+            return events[eventId]
+        return FakeRequest(self.service, 'events.update', run)
+
+    def get(self, calendarId=None, eventId=None, **kwargs):
+        def run():
+            event = self.service.calendars.get(calendarId, {}).get(eventId)
+            if event is None:
+                raise make_http_error(404, 'notFound')
+            return event
+        return FakeRequest(self.service, 'events.get', run)
+
+    def delete(self, calendarId=None, eventId=None, **kwargs):
+        def run():
+            if self.service.calendars.get(calendarId, {}).pop(eventId, None) is None:
+                raise make_http_error(410, 'deleted')
+            return ''
+        return FakeRequest(self.service, 'events.delete', run)
+
+class FakeCalendarService:
+    """Имитация googleapiclient-сервиса Calendar v3 (events и batch)"""
+
+    def __init__(self, stats: ApiStats, latency: float):
+        self.stats = stats
+        self.latency = latency
+        self.calendars = {}
+        self.etag_counter = 0
+        self._events = FakeEvents(self)
+
+    def events(self):
+        return self._events
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
@@ -0,0 +1,192 @@
+"""Офлайн-бенчмарк цепочки таблица -> хранилище -> календарь
+
+Запуск из корня проекта:
+
+    python -m bench.run_pipeline                      # сравнить с bench/baselines.json (код 1 — выросло
+                                                      # число вызовов API, 2 — нет базовых значений)
+    python -m bench.run_pipeline --save-baseline      # записать новые базовые значения
+    python -m bench.run_pipeline --sizes 100 --latency 0.05
+
+Google Sheets и Calendar заменяются клиентами из bench.fakes с заданной
+задержкой, хранилище и состояние пишутся во временную директорию. Для
+каждого размера листа измеряются общее время, число вызовов API, пиковая
+память (tracemalloc, отдельным прогоном) и время по этапам upload_shifts.
+Проверяется только число вызовов API; время и память выводятся для сравнения.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from unittest import mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+DEFAULT_SIZES = (100, 1000, 10000)
+
+def configure_environment(workdir: str, respect_quota: bool) -> None:
+    """Настраивает окружение до импорта shared.config"""
+    os.environ['DATABASE_DIR'] = os.path.join(workdir, 'database')
+    os.environ['LOGS_DIR'] = os.path.join(workdir, 'logs')
+    os.environ.setdefault('TELEGRAM_TOKEN', 'bench')
+    os.environ.setdefault('CALENDAR_ID', 'bench@group.calendar.google.com')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['SHEET_CHANGE_DETECTION'] = '0'
+    if not respect_quota:
+        for name in ('CALENDAR_QPS', 'CALENDAR_USER_QPS', 'SHEETS_QPS'):
+            os.environ[name] = '0'  # 0 — ограничитель частоты выключен
+
+def histogram_sums(histogram, label: str) -> dict:
+    """Суммы гистограммы по значению метки"""
+    sums = {}
+    for name, key, value in histogram.samples():
+        if name.endswith('_sum'):
+            labels = dict(key)
+            sums[labels.get(label, '')] = sums.get(labels.get(label, ''), 0.0) + value
+    return sums
+
+def run_once(rows: int, latency: float, trace_memory: bool = False) -> dict:
+    """Один прогон upload_shifts(force=True) на чистом хранилище"""
+    from bench.fakes import ApiStats, make_sheets_session, FakeCalendarService
+    from shared import calendar_api, storage
+    from shared.metrics import SHEET_STAGE_SECONDS
+    from shared.shift_repository import notify_shifts_changed
+    from calendar_uploader.uploader import upload_shifts
+
+    stats = ApiStats()
+    session = make_sheets_session(rows, stats, latency)
+    service = FakeCalendarService(stats, latency)
+    storage.get_storage().save_shifts([])
+    notify_shifts_changed()
+    if os.path.exists(calendar_api.CALENDAR_STATE_PATH):
+        os.remove(calendar_api.CALENDAR_STATE_PATH)
+
+    stages = {}
+    current = {'stage': 'start', 'at': time.perf_counter()}
+
+    def progress(stage, done=0, total=0):
+        now = time.perf_counter()
+        if stage != current['stage']:
+            stages[current['stage']] = stages.get(current['stage'], 0.0) + now - current['at']
+            current.update(stage=stage, at=now)
+
+    sheet_before = histogram_sums(SHEET_STAGE_SECONDS, 'stage')
+    with mock.patch('shared.sheet_parser.get_sheets_session', lambda refresh=False, url=None: session), \
+            mock.patch('shared.google_clients.get_calendar_service', lambda: service):
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        report = upload_shifts(force=True, progress=progress)
+        wall = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    progress('end')
+
+    sheet_after = histogram_sums(SHEET_STAGE_SECONDS, 'stage')
+    for stage, total in sheet_after.items():
+        delta = total - sheet_before.get(stage, 0.0)
+        if delta:
+            stages[f'sheet.{stage}'] = delta
+    stages.pop('start', None)
+
+    return {
+        'rows': rows,
+        'wall_time': round(wall, 4),
+        'api_calls': stats.total,
+        'api_calls_by_method': dict(sorted(stats.calls.items())),
+        'peak_memory_mb': round(peak / 1024 / 1024, 2) if peak is not None else None,
+        'stages': {stage: round(value, 4) for stage, value in sorted(stages.items())},
+        'created': report.get('created') if isinstance(report, dict) else None,
+        'failed': report.get('failed') if isinstance(report, dict) else None
+    }
+
+def run_size(rows: int, latency: float) -> dict:
+    result = run_once(rows, latency)
+    result['peak_memory_mb'] = run_once(rows, latency, trace_memory=True)['peak_memory_mb']
+    return result
+
+def compare(results: dict, baselines: dict) -> list:
+    """Возвращает список регрессий относительно базовых значений
+
+    Регрессия — только рост числа вызовов API: оно не зависит от машины.
+    Время и память зависят от машины, на которой сняты базовые значения,
+    поэтому они только выводятся рядом с базовыми (см. describe_drift).
+    """
+    regressions = []
+    for size, result in results.items():
+        base = baselines.get(size)
+        if not base:
+            continue
+        if result['api_calls'] > base['api_calls']:
+            regressions.append(f"{size} строк: вызовов API {result['api_calls']} > {base['api_calls']}")
+    return regressions
+
+def describe_drift(results: dict, baselines: dict) -> list:
+    """Сравнение времени и памяти с базовыми значениями для вывода, без проверки"""
+    lines = []
+    for size, result in results.items():
+        base = baselines.get(size) or {}
+        for metric in ('wall_time', 'peak_memory_mb'):
+            if base.get(metric) and result.get(metric):
+                lines.append(f"{size} строк: {metric} {result[metric]} (база {base[metric]}, "
+                             f"{result[metric] / base[metric] - 1:+.0%})")
+    return lines
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Офлайн-бенчмарк загрузки смен')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка одного запроса к API, с')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--respect-quota', action='store_true', help='не отключать ограничители частоты')
+    parser.add_argument('--output', help='файл для JSON с результатами')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='barhub-bench-')
+    configure_environment(workdir, args.respect_quota)
+    sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+    results = {}
+    for rows in args.sizes:
+        result = run_size(rows, args.latency)
+        results[str(rows)] = result
+        print(f"{rows:>6} строк: {result['wall_time']:.3f} с, вызовов API {result['api_calls']}, "
+              f"пик памяти {result['peak_memory_mb']} МБ, этапы {result['stages']}")
+
+    payload = {'latency': args.latency, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"Базовые значения сохранены в {BASELINE_PATH}")
+        return 0
+
+    # Без базовых значений сравнивать не с чем: это ошибка, а не успешный прогон
+    if not os.path.exists(BASELINE_PATH):
+        print(f"ОШИБКА: базовые значения не найдены ({BASELINE_PATH}), запустите с --save-baseline")
+        return 2
+    with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('latency') != args.latency:
+        print(f"ОШИБКА: базовые значения сняты с задержкой {baseline.get('latency')}, "
+              f"а прогон — с {args.latency}; запустите с --latency {baseline.get('latency')}")
+        return 2
+    missing = [size for size in results if size not in baseline.get('results', {})]
+    if missing:
+        print(f"ОШИБКА: нет базовых значений для размеров {', '.join(missing)}")
+        return 2
+
+    for line in describe_drift(results, baseline.get('results', {})):
+        print(line)
+    regressions = compare(results, baseline.get('results', {}))
+    for line in regressions:
+        print(f"РЕГРЕССИЯ: {line}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
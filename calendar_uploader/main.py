@@ -2,37 +2,23 @@ import os
 import json
 import datetime
 import logging
-from shared.config import GOOGLE_CREDS_PATH, CALENDAR_ID, TIMEZONE
+from shared.config import CALENDAR_ID, TIMEZONE
 from shared.logger import logger
 from shared.sheet_parser import sync_shifts_to_json
+from shared.executor import run_blocking
 from .uploader import upload_shifts_to_calendar
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+from shared import google_clients
+from shared.google_requests import execute
 from googleapiclient.errors import HttpError
 
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-
 def get_calendar_service():
-    """Создает и возвращает сервис Google Calendar API"""
-    logger.debug(f"Инициализация сервиса Google Calendar с учетными данными из {GOOGLE_CREDS_PATH}")
-    
-    if not os.path.exists(GOOGLE_CREDS_PATH):
-        logger.error(f"Не найден файл авторизации: {GOOGLE_CREDS_PATH}")
-        raise FileNotFoundError("Google credentials file not found")
-
-    try:
-        creds = Credentials.from_service_account_file(GOOGLE_CREDS_PATH, scopes=SCOPES)
-        service = build('calendar', 'v3', credentials=creds)
-        logger.info("Google Calendar API авторизован успешно")
-        return service
-    except Exception as e:
-        logger.error(f"Ошибка при инициализации сервиса календаря: {str(e)}")
-        raise
+    """Возвращает общий сервис Google Calendar API из реестра клиентов"""
+    return google_clients.get_calendar_service()
 
 def add_event(summary: str, description: str, start_time: datetime.datetime, 
               end_time: datetime.datetime, calendar_id: str = CALENDAR_ID) -> dict:
     """Добавляет событие в календарь"""
-    logger.debug(f"Добавление события '{summary}' на {start_time}")
+    logger.debug("Добавление события '%s' на %s", summary, start_time)
     
     service = get_calendar_service()
     
@@ -44,7 +30,7 @@ def add_event(summary: str, description: str, start_time: datetime.datetime,
             'end': {'dateTime': end_time.isoformat(), 'timeZone': TIMEZONE},
         }
 
-        created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
+        created_event = execute(service.events().insert(calendarId=calendar_id, body=event))
         logger.info(f"Событие успешно добавлено в календарь: {created_event.get('htmlLink')}")
         return created_event
     except HttpError as e:
@@ -65,7 +51,8 @@ async def run_uploader():
         summary = "Тестовая смена"
         description = "Тестовое событие для проверки работы календаря"
 
-        created_event = add_event(
+        created_event = await run_blocking(
+            add_event,
             summary=summary, 
             description=description, 
             start_time=start_time, 
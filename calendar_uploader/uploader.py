@@ -2,13 +2,34 @@ from shared.logger import logger
 from shared.calendar_api import (
     get_calendar_service, 
     load_shifts_from_db, 
-    upsert_shift_event,
+    upsert_shift_events,
+    parse_shift_times,
     save_shifts
 )
-from shared.sheet_parser import sync_shifts_to_json
-from shared.config import SHIFTS_DB_PATH
-from datetime import datetime, timedelta
-import asyncio
+from shared.reconcile import build_sync_plan, log_plan, apply_sync_plan, plan_window
+from shared.rate_limit import get_calendar_slot
+from shared.venues import route_shifts
+from shared.sheet_parser import sync_sheet_snapshot, mark_sheet_synced, iter_backfill_shifts
+from shared.storage import get_storage
+from shared.shift_repository import shift_repository
+from shared.single_flight import SingleFlight
+from shared.executor import get_calendar_executor
+from shared.config import (
+    SHIFTS_DB_PATH,
+    CALENDAR_BATCH_MODE,
+    CALENDAR_SYNC_MODE,
+    SHEET_CHANGE_DETECTION,
+    SYNC_WEEKDAY,
+    SYNC_TIME,
+    PUBLICATION_WINDOW_BEFORE,
+    PUBLICATION_WINDOW_AFTER
+)
+from shared.scheduler import Scheduler
+from shared.metrics import UPLOAD_RUNS, UPLOAD_SHIFTS, UPLOAD_SECONDS
+from concurrent.futures import wait
+from datetime import datetime, timedelta, date
+import threading
+import time
 
 def get_current_week():
     today = datetime.now()
@@ -18,38 +39,203 @@ def get_current_week():
 def has_next_week_shifts():
     """Проверяет, есть ли смены на следующую неделю"""
     logger.debug("Проверка наличия смен на следующую неделю")
-    shifts = load_shifts_from_db()
-    if not shifts:
-        logger.info("Нет сохраненных смен")
-        return False
-        
     current_week = get_current_week()
     next_week = current_week + timedelta(weeks=1)
     next_week_end = next_week + timedelta(days=6)
-    
-    for shift in shifts:
-        try:
-            shift_date = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S')
-            if next_week.date() <= shift_date.date() <= next_week_end.date():
-                logger.debug(f"Найдена смена на следующую неделю: {shift['employee_name']} на {shift_date}")
-                return True
-        except Exception as e:
-            logger.error(f"Ошибка при проверке смены: {e}")
-            continue
+
+    if shift_repository.has_between(next_week.date(), next_week_end.date()):
+        logger.debug("Найдены смены на следующую неделю")
+        return True
             
     logger.info("Смен на следующую неделю не найдено")
     return False
 
-def upload_shifts(force: bool = False):
+REPORT_COUNTERS = ('created', 'updated', 'deleted', 'unchanged', 'skipped', 'failed')
+
+def _sync_calendar(calendar_id: str, shifts: list, force: bool, window: tuple, batch: bool,
+                   dry_run: bool, progress) -> dict:
+    """Синхронизирует смены одного календаря в отдельном потоке со своим клиентом API"""
+    with get_calendar_slot(calendar_id):
+        service = get_calendar_service()
+        if CALENDAR_SYNC_MODE == 'direct' and not dry_run:
+            return upsert_shift_events(service, shifts, force=force, batch=batch,
+                                       calendar_id=calendar_id, progress=progress, window=window)
+
+        plan = build_sync_plan(service, shifts, force=force, calendar_id=calendar_id, window=window)
+        log_plan(plan)
+        if dry_run:
+            return plan
+        return apply_sync_plan(service, plan, batch=batch, progress=progress)
+
+def sync_calendars(shifts: list, force: bool = False, batch: bool = CALENDAR_BATCH_MODE, dry_run: bool = False,
+                   progress=None, window: tuple = None) -> dict:
+    """Раскладывает смены по календарям заведений и синхронизирует календари параллельно
+
+    Каждый календарь обрабатывается в своем потоке с собственной квотой
+    запросов, поэтому общее время ограничено самым медленным заведением.
+    Окно сверки общее для всех календарей.
+
+    Returns:
+        dict: суммарные счетчики, items и отчеты по календарям (calendars);
+            при dry_run — планы по календарям (plans)
+    """
+    routed = route_shifts(shifts)
+    if window is None:
+        dates = []
+        for shift in shifts:
+            try:
+                dates.append(parse_shift_times(shift)[0])
+            except Exception:
+                continue
+        window = plan_window(dates, force)
+
+    lock = threading.Lock()
+    written = {}
+
+    def calendar_progress(calendar_id):
+        if progress is None:
+            return None
+
+        def report(stage, done=0, total=0):
+            with lock:
+                written[calendar_id] = (done, total)
+                progress(stage, sum(d for d, _ in written.values()), sum(t for _, t in written.values()))
+        return report
+
+    pool = get_calendar_executor()
+    futures = {
+        calendar_id: pool.submit(_sync_calendar, calendar_id, items, force, window, batch, dry_run,
+                                 calendar_progress(calendar_id))
+        for calendar_id, items in routed.items()
+    }
+    wait(futures.values())
+
+    if dry_run:
+        return {'plans': {calendar_id: future.result() for calendar_id, future in futures.items()}}
+
+    report = {key: 0 for key in REPORT_COUNTERS}
+    report.update({'items': [], 'calendars': {}})
+    for calendar_id, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Ошибка синхронизации календаря {calendar_id}: {e}")
+            result = {key: 0 for key in REPORT_COUNTERS}
+            result.update({'failed': len(routed[calendar_id]) or 1, 'items': [], 'error': str(e)})
+        for key in REPORT_COUNTERS:
+            report[key] += result[key]
+        report['items'].extend(result['items'])
+        report['calendars'][calendar_id] = {key: result[key] for key in REPORT_COUNTERS}
+    return report
+
+def backfill_shifts(start: date, end: date, batch: bool = CALENDAR_BATCH_MODE, dry_run: bool = False,
+                    progress=None):
+    """Загружает в календарь смены за несколько недель
+
+    Листы читаются параллельно, и каждая неделя сверяется с календарем сразу
+    после разбора, не дожидаясь остальных. Окно сверки недели ограничено
+    диапазоном дат, поэтому события вне диапазона не удаляются.
+
+    Returns:
+        dict: суммарный отчет по всем неделям и список недель с ошибками чтения
+    """
+    logger.info(f"Запуск backfill смен за {start} - {end} (batch={batch}, dry_run={dry_run})")
+    report_progress = progress or (lambda stage, done=0, total=0: None)
+    report_progress('fetch')
+
+    totals = {key: 0 for key in REPORT_COUNTERS}
+    totals.update({'weeks': 0, 'sheet_errors': [], 'plans': []})
+    archived = []
+
+    for week in iter_backfill_shifts(start, end):
+        if week['error']:
+            totals['sheet_errors'].append({'title': week['title'], 'error': week['error']})
+            continue
+        totals['weeks'] += 1
+        archived.extend(week['shifts'])
+        if not week['shifts']:
+            continue
+
+        window_start = max(week['week'], start)
+        window_end = min(week['week'] + timedelta(days=6), end) + timedelta(days=1)
+        window = (datetime.combine(window_start, datetime.min.time()), datetime.combine(window_end, datetime.min.time()))
+
+        report_progress('plan', totals['weeks'])
+        report = sync_calendars(week['shifts'], force=True, batch=batch, dry_run=dry_run, window=window)
+        if dry_run:
+            totals['plans'].append(report['plans'])
+            continue
+
+        for key in REPORT_COUNTERS:
+            totals[key] += report[key]
+        report_progress('apply', totals['weeks'])
+
+    if not dry_run:
+        get_storage().archive_shifts(archived)
+
+    logger.info(
+        f"Backfill завершен: недель {totals['weeks']}, создано {totals['created']}, обновлено {totals['updated']}, "
+        f"удалено {totals['deleted']}, ошибок {totals['failed']}, ошибок чтения листов {len(totals['sheet_errors'])}"
+    )
+    return totals
+
+def record_upload_metrics(result, duration: float, dry_run: bool = False) -> None:
+    """Учитывает запуск upload_shifts в метриках: результат, длительность и смены по действиям"""
+    if dry_run:
+        status = 'dry_run'
+    elif isinstance(result, dict) and 'created' in result:
+        status = 'failed' if result['failed'] else 'ok'
+        for action in REPORT_COUNTERS:
+            UPLOAD_SHIFTS.inc(result[action], action=action)
+    elif isinstance(result, dict) and result.get('status') == 'unchanged':
+        status = 'unchanged'
+    else:
+        status = 'skipped'
+    UPLOAD_RUNS.inc(status=status)
+    UPLOAD_SECONDS.observe(duration, status=status)
+
+def upload_shifts(force: bool = False, batch: bool = CALENDAR_BATCH_MODE, dry_run: bool = False,
+                  progress=None, date_range: tuple = None):
+    """Загружает смены в Google Calendar с учетом в метриках (см. _upload_shifts)"""
+    started = time.perf_counter()
+    try:
+        result = _upload_shifts(force=force, batch=batch, dry_run=dry_run, progress=progress, date_range=date_range)
+    except Exception:
+        UPLOAD_RUNS.inc(status='error')
+        UPLOAD_SECONDS.observe(time.perf_counter() - started, status='error')
+        raise
+    record_upload_metrics(result, time.perf_counter() - started, dry_run)
+    return result
+
+def _upload_shifts(force: bool = False, batch: bool = CALENDAR_BATCH_MODE, dry_run: bool = False,
+                   progress=None, date_range: tuple = None):
     """Загружает смены из JSON в Google Calendar
     
     Args:
         force (bool): Если True, загружает все смены без проверки даты (ручной режим)
+        batch (bool): Если True, отправляет события batch-запросами по 50 штук
+        dry_run (bool): Если True, только строит и логирует план без записи в календарь
+        progress (callable): progress(stage, done, total) — отчет о ходе для фоновых задач
+        date_range (tuple): (date, date) — backfill смен за несколько недель
+
+    Returns:
+        dict | None: отчет загрузки с результатом по каждой смене (план при dry_run);
+            {'status': 'unchanged'}, если таблица не менялась с последней успешной загрузки
     """
-    logger.info(f"Запуск загрузки смен (force={force})")
+    if date_range:
+        return backfill_shifts(*date_range, batch=batch, dry_run=dry_run, progress=progress)
+
+    logger.info(f"Запуск загрузки смен (force={force}, batch={batch}, dry_run={dry_run})")
     
+    report_progress = progress or (lambda stage, done=0, total=0: None)
+
     logger.debug("Запуск синхронизации с Google таблицей")
-    if sync_shifts_to_json(force=force):
+    report_progress('fetch')
+    snapshot = sync_sheet_snapshot(force=force, detect_changes=SHEET_CHANGE_DETECTION and not force)
+    if snapshot['status'] == 'unchanged':
+        logger.info("Таблица не изменилась с последней успешной загрузки, пропускаем")
+        return {'status': 'unchanged'}
+    if snapshot['status'] == 'changed':
         logger.info("Синхронизация с таблицей успешна")
     else:
         logger.warning("Синхронизация с таблицей не удалась")
@@ -57,6 +243,8 @@ def upload_shifts(force: bool = False):
     
     if not force:
         if not has_next_week_shifts():
+            # Отпечаток не сохраняем: лист, опубликованный заранее, нужно загрузить,
+            # когда его неделя станет следующей, даже если таблица не изменится
             logger.info("Нет смен на следующую неделю, пропускаем автоматическую загрузку")
             return
         logger.info("Найдены смены на следующую неделю, продолжаем автоматическую загрузку")
@@ -67,29 +255,60 @@ def upload_shifts(force: bool = False):
         return
 
     try:
-        service = get_calendar_service()
-        logger.debug("Сервис календаря получен успешно")
-        
-        for shift in shifts:
-            try:
-                upsert_shift_event(service, shift, force=force)
-            except Exception as e:
-                logger.error(f"Ошибка при обработке смены {shift.get('employee_name')}: {e}")
-        
+        report_progress('plan')
+        report = sync_calendars(shifts, force=force, batch=batch, dry_run=dry_run, progress=progress)
+        if dry_run:
+            return report
+
+        if not report['failed']:
+            mark_sheet_synced(snapshot['fingerprint'])
         logger.info("Загрузка смен в календарь завершена")
+        return report
     except Exception as e:
         logger.error(f"Критическая ошибка при загрузке смен: {e}")
         raise
 
+def merge_upload_kwargs(current: dict, new: dict) -> dict:
+    """Объединяет аргументы вызовов, схлопнутых в одну загрузку"""
+    merged = {**current, **new}
+    merged['force'] = current.get('force', False) or new.get('force', False)
+    merged['dry_run'] = current.get('dry_run', False) and new.get('dry_run', False)
+    return merged
+
+# Единая точка запуска загрузки для периодического загрузчика, планировщика и кнопок бота
+upload_flight = SingleFlight(upload_shifts, name='upload_shifts', merge=merge_upload_kwargs)
+
+def in_publication_window(now: datetime) -> bool:
+    """Проверяет, что сейчас окно публикации графика вокруг еженедельной синхронизации"""
+    hour, minute = map(int, SYNC_TIME.split(':'))
+    sync_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    sync_at += timedelta(days=SYNC_WEEKDAY - now.weekday())
+    for moment in (sync_at - timedelta(weeks=1), sync_at, sync_at + timedelta(weeks=1)):
+        if moment - timedelta(hours=PUBLICATION_WINDOW_BEFORE) <= now <= moment + timedelta(hours=PUBLICATION_WINDOW_AFTER):
+            return True
+    return False
+
+async def weekly_sync():
+    """Плановая синхронизация смен на следующую неделю"""
+    logger.info("Запуск регулярной синхронизации смен на следующую неделю...")
+    result = await upload_flight.run_async()
+    logger.info("Регулярная синхронизация успешно завершена")
+    return result
+
+async def poll_shifts():
+    """Проверка таблицы на новые смены; {'status': 'unchanged'} увеличивает интервал опроса"""
+    result = await upload_flight.run_async()  # Автоматическая загрузка только для следующей недели
+    logger.debug("Проверка смен завершена")
+    return result
+
+def register_upload_jobs(scheduler: Scheduler) -> Scheduler:
+    """Регистрирует еженедельную синхронизацию и адаптивный опрос таблицы"""
+    hour, minute = map(int, SYNC_TIME.split(':'))
+    scheduler.cron('weekly_sync', weekly_sync, weekday=SYNC_WEEKDAY, hour=hour, minute=minute)
+    scheduler.adaptive('poll_shifts', poll_shifts, hot_window=in_publication_window)
+    return scheduler
+
 async def run_uploader():
-    """Запускает автоматическую загрузку смен"""
+    """Запускает автоматическую загрузку смен в отдельном планировщике"""
     logger.info("Запуск загрузчика смен в календарь...")
-    while True:
-        try:
-            upload_shifts()  # Автоматическая загрузка только для следующей недели
-            logger.info("Загрузка смен успешно завершена")
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке смен: {e}")
-        
-        await asyncio.sleep(300)
-        logger.debug("Следующая проверка смен...")
+    await register_upload_jobs(Scheduler()).run()
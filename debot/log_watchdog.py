@@ -1,72 +1,247 @@
 import os
+import sys
+import json
 import time
+import logging
+import threading
+from collections import Counter
 from datetime import datetime
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from shared.config import LOG_FILE_PATH, LOGS_DIR
-from shared.logger import logger
+from shared.config import (
+    LOG_FILE_PATH,
+    LOGS_DIR,
+    DEBOT_LOG_PATH,
+    DEBOT_STATE_PATH,
+    DEBOT_CHUNK_SIZE,
+    DEBOT_MAX_BATCH_BYTES,
+    DEBOT_FLUSH_INTERVAL
+)
+from shared.fileio import atomic_write_json
+
+DEBOT_TAG = '[debot]'
+MAX_SAMPLES = 5
+# Уровни в текстовом формате и в JSON Lines (LOG_FORMAT=json)
+ERROR_MARKERS = (' - ERROR - ', ' - CRITICAL - ', '"level":"ERROR"', '"level":"CRITICAL"')
+WARNING_MARKERS = (' - WARNING - ', '"level":"WARNING"')
+SAFETY_POLL = 30
+
+def get_debot_logger() -> logging.Logger:
+    """Логгер мониторинга: пишет в debot.log и консоль, но не в отслеживаемый barhub.log"""
+    debot_logger = logging.getLogger('debot')
+    if not debot_logger.handlers:
+        os.makedirs(os.path.dirname(DEBOT_LOG_PATH), exist_ok=True)
+        formatter = logging.Formatter(f'%(asctime)s - %(levelname)s - {DEBOT_TAG} %(message)s')
+        for handler in (logging.FileHandler(DEBOT_LOG_PATH, encoding='utf-8'), logging.StreamHandler(sys.stdout)):
+            handler.setFormatter(formatter)
+            debot_logger.addHandler(handler)
+        debot_logger.setLevel(logging.INFO)
+        debot_logger.propagate = False
+    return debot_logger
+
+logger = get_debot_logger()
+
+class LogTailer:
+    """Инкрементальное чтение лог-файла с учетом ротации и усечения
+
+    Позиция (inode и смещение) сохраняется в DEBOT_STATE_PATH, поэтому после
+    перезапуска чтение продолжается с места остановки. Файл читается блоками
+    по chunk_size байт и не больше max_bytes за один вызов; незавершенная
+    последняя строка остается до следующего чтения. После ротации старый файл
+    дочитывается по открытому дескриптору, затем чтение идет с начала нового.
+    """
+
+    def __init__(self, path: str = LOG_FILE_PATH, state_path: str = DEBOT_STATE_PATH,
+                 chunk_size: int = DEBOT_CHUNK_SIZE, max_bytes: int = DEBOT_MAX_BATCH_BYTES):
+        self.path = path
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self._file = None
+        self._inode = None
+        self._offset = 0
+        self._partial = b''
+        self.has_more = False
+        self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self._inode, self._offset = state.get('inode'), int(state.get('offset', 0))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать позицию мониторинга {self.state_path}: {e}")
+
+    def save_state(self):
+        try:
+            # незавершенная строка будет перечитана после перезапуска
+            offset = self._offset - len(self._partial)
+            atomic_write_json(self.state_path, {'path': self.path, 'inode': self._inode, 'offset': offset})
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении позиции мониторинга: {e}")
+
+    def _open_current(self) -> bool:
+        """Открывает текущий файл; позиция сохраняется, только если это тот же inode"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        inode = os.fstat(f.fileno()).st_ino
+        if inode != self._inode:
+            if self._inode is not None:
+                logger.info(f"Лог-файл {self.path} заменен (ротация), чтение с начала")
+            self._inode, self._offset, self._partial = inode, 0, b''
+        self._file = f
+        return True
+
+    def _read(self, budget: int) -> bytes:
+        """Читает до budget байт с текущего смещения открытого файла"""
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._offset:
+            logger.info(f"Лог-файл {self.path} усечен, чтение с начала")
+            self._offset, self._partial = 0, b''
+        self._file.seek(self._offset)
+        chunks = []
+        while budget > 0:
+            chunk = self._file.read(min(self.chunk_size, budget))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            budget -= len(chunk)
+            self._offset += len(chunk)
+        return b''.join(chunks)
+
+    def _rotated(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return False
+
+    def read_lines(self) -> list:
+        """Возвращает новые полные строки (не больше max_bytes за вызов)
+
+        Если лимит исчерпан, has_more == True и остаток читается следующим вызовом.
+        """
+        self.has_more = False
+        if self._file is None and not self._open_current():
+            return []
+
+        chunk = self._read(self.max_bytes)
+        data, self._partial = self._partial + chunk, b''
+        self.has_more = len(chunk) >= self.max_bytes
+        if not self.has_more and self._rotated():
+            # старый файл дочитан по открытому дескриптору — переключаемся на новый
+            self._file.close()
+            self._file = None
+            if data and not data.endswith(b'\n'):
+                data += b'\n'
+            if self._open_current():
+                rest = self._read(self.max_bytes - len(chunk))
+                self.has_more = len(chunk) + len(rest) >= self.max_bytes
+                data += rest
+
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        self.save_state()
+        return [line.decode('utf-8', 'replace') for line in lines if line]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def analyze_logs(lines: list) -> dict:
+    """Анализирует пачку строк: считает ошибки и предупреждения и пишет одну сводку
+
+    Строки самого мониторинга (с меткой DEBOT_TAG) пропускаются, чтобы не
+    образовать петлю обратной связи.
+    """
+    counts = Counter()
+    samples = []
+    for line in lines:
+        if DEBOT_TAG in line:
+            counts['own'] += 1
+            continue
+        if any(marker in line for marker in ERROR_MARKERS):
+            counts['error'] += 1
+            if len(samples) < MAX_SAMPLES:
+                samples.append(line)
+        elif any(marker in line for marker in WARNING_MARKERS):
+            counts['warning'] += 1
+
+    if counts['error']:
+        logger.warning(f"Обнаружено критических записей: {counts['error']}, предупреждений: {counts['warning']} "
+                       f"(из {len(lines)} строк)")
+        for line in samples:
+            logger.warning(f"  {line}")
+    elif counts['warning']:
+        logger.info(f"Обнаружено предупреждений: {counts['warning']} (из {len(lines)} строк)")
+    return counts
 
 class LogFileHandler(FileSystemEventHandler):
-    """Обработчик событий файловой системы для лог-файла"""
-    
-    def __init__(self):
-        self.last_position = 0
+    """Обработчик событий файловой системы: только отмечает, что лог изменился
+
+    Сами изменения читаются пачками в цикле run_watchdog, поэтому поток
+    событий modify не приводит к чтению файла на каждую запись.
+    """
+
+    def __init__(self, path: str = LOG_FILE_PATH):
+        self.path = os.path.abspath(path)
+        self.changed = threading.Event()
         self.check_file_exists()
-    
+
     def check_file_exists(self):
         """Проверяет существование лог-файла и создает его при необходимости"""
         if not os.path.exists(LOGS_DIR):
             os.makedirs(LOGS_DIR)
             logger.info(f"Создана директория логов: {LOGS_DIR}")
-            
-        if not os.path.exists(LOG_FILE_PATH):
-            with open(LOG_FILE_PATH, 'w', encoding='utf-8') as f:
+
+        if not os.path.exists(self.path):
+            with open(self.path, 'w', encoding='utf-8') as f:
                 f.write(f"=== Лог-файл создан {datetime.now().isoformat()} ===\n")
-            logger.info(f"Создан новый лог-файл: {LOG_FILE_PATH}")
-    
-    def on_modified(self, event):
-        """Обрабатывает событие изменения файла"""
-        if event.src_path == LOG_FILE_PATH:
-            self.process_new_logs()
-    
-    def process_new_logs(self):
-        """Обрабатывает новые записи в лог-файле"""
-        try:
-            with open(LOG_FILE_PATH, 'r', encoding='utf-8') as f:
-                f.seek(self.last_position)
-                new_logs = f.read()
-                if new_logs:
-                    self.analyze_logs(new_logs)
-                self.last_position = f.tell()
-        except Exception as e:
-            logger.error(f"Ошибка при чтении лог-файла: {e}")
-    
-    def analyze_logs(self, logs):
-        """Анализирует новые логи на наличие важных событий или ошибок"""
-        for line in logs.splitlines():
-            if "ERROR" in line or "CRITICAL" in line:
-                logger.warning(f"Обнаружена критическая запись в логах: {line}")
-            elif "WARNING" in line:
-                logger.info(f"Обнаружено предупреждение: {line}")
+            logger.info(f"Создан новый лог-файл: {self.path}")
+
+    def on_any_event(self, event):
+        paths = {os.path.abspath(event.src_path), os.path.abspath(getattr(event, 'dest_path', '') or event.src_path)}
+        if self.path in paths:
+            self.changed.set()
 
 def run_watchdog():
     """Запускает отслеживание лог-файла"""
     logger.info("Запуск системы мониторинга логов...")
-    
+
     try:
         event_handler = LogFileHandler()
+        tailer = LogTailer()
         observer = Observer()
         observer.schedule(event_handler, path=LOGS_DIR, recursive=False)
         observer.start()
         logger.info("Мониторинг лог-файла запущен успешно")
-        
+
         try:
+            last_check = 0.0
             while True:
-                time.sleep(1)
+                # изменения копятся и обрабатываются одной пачкой не чаще раза в DEBOT_FLUSH_INTERVAL;
+                # раз в SAFETY_POLL секунд файл проверяется и без событий файловой системы
+                time.sleep(DEBOT_FLUSH_INTERVAL)
+                if not event_handler.changed.is_set() and time.monotonic() - last_check < SAFETY_POLL:
+                    continue
+                event_handler.changed.clear()
+                last_check = time.monotonic()
+                while True:
+                    lines = tailer.read_lines()
+                    if lines:
+                        analyze_logs(lines)
+                    if not tailer.has_more:
+                        break
         except KeyboardInterrupt:
             observer.stop()
             logger.info("Мониторинг логов остановлен пользователем")
-        
+        finally:
+            tailer.close()
+
         observer.join()
     except Exception as e:
         logger.error(f"Ошибка при запуске мониторинга логов: {e}")
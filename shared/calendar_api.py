@@ -1,82 +1,54 @@
 import os
 import json
+import base64
+import hashlib
 import logging
+import threading
 from datetime import datetime, timedelta
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from shared import google_clients
+from shared.calendar_batch import execute_batched
+from shared.rate_limit import get_calendar_limiter
+from shared.google_requests import execute
+from shared.fileio import atomic_write_json
+from shared.storage import get_storage
+from shared.shift_repository import shift_repository, notify_shifts_changed
 from shared.config import (
-    GOOGLE_CREDS_PATH, 
     CALENDAR_ID, 
-    SHIFTS_DB_PATH,
+    CALENDAR_STATE_PATH,
+    CALENDAR_DELETE_STALE,
     TIMEZONE
 )
 
 logger = logging.getLogger('barhub')
-SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 def get_calendar_service():
-    """Создает и возвращает сервис Google Calendar API"""
-    logger.debug(f"Попытка создания сервиса календаря с файлом {GOOGLE_CREDS_PATH}")
-    
-    if not os.path.exists(GOOGLE_CREDS_PATH):
-        logger.error(f"Не найден файл авторизации: {GOOGLE_CREDS_PATH}")
-        raise FileNotFoundError("Google credentials file not found")
+    """Возвращает общий сервис Google Calendar API из реестра клиентов"""
+    return google_clients.get_calendar_service()
 
-    try:
-        logger.debug("Загрузка учетных данных из файла...")
-        creds = Credentials.from_service_account_file(GOOGLE_CREDS_PATH, scopes=SCOPES)
-        service = build('calendar', 'v3', credentials=creds)
-        logger.info("Google Calendar API авторизован успешно")
-        return service
-    except Exception as e:
-        logger.error(f"Ошибка при создании сервиса календаря: {str(e)}")
-        raise
-
-def save_shifts(shifts: list, path: str = SHIFTS_DB_PATH) -> None:
-    """Сохраняет список смен в JSON-файл"""
-    logger.debug(f"Попытка сохранения {len(shifts)} смен в {path}")
-    
-    dir_path = os.path.dirname(path)
-    if dir_path and not os.path.exists(dir_path):
-        try:
-            os.makedirs(dir_path, exist_ok=True)
-            logger.debug(f"Создана директория для хранения смен: {dir_path}")
-        except Exception as e:
-            logger.error(f"Не удалось создать директорию {dir_path}: {e}")
-            raise
+def save_shifts(shifts: list, path: str = None) -> None:
+    """Сохраняет список смен в хранилище (или в указанный JSON-файл)"""
+    target = path or get_storage().name
+    logger.debug("Попытка сохранения %s смен в %s", len(shifts), target)
 
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(shifts, f, ensure_ascii=False, indent=4)
-        logger.info(f"Успешно сохранено {len(shifts)} смен в {path}")
+        if path:
+            atomic_write_json(path, shifts, indent=4)
+        else:
+            get_storage().save_shifts(shifts)
+            notify_shifts_changed()
+        logger.info("Успешно сохранено %s смен в %s", len(shifts), target)
     except Exception as e:
-        logger.exception(f"Ошибка при сохранении смен в {path}: {e}")
+        logger.exception(f"Ошибка при сохранении смен в {target}: {e}")
         raise
 
 def load_shifts_from_db() -> list:
-    """Загружает смены из JSON файла"""
-    logger.debug(f"Попытка загрузки смен из {SHIFTS_DB_PATH}")
-    
-    if not os.path.exists(SHIFTS_DB_PATH):
-        logger.warning(f"Файл {SHIFTS_DB_PATH} не найден")
-        return []
-        
-    try:
-        with open(SHIFTS_DB_PATH, 'r', encoding='utf-8') as f:
-            shifts = json.load(f)
-        logger.info(f"Успешно загружено {len(shifts)} смен из {SHIFTS_DB_PATH}")
-        return shifts
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка при чтении {SHIFTS_DB_PATH}. Файл поврежден: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"Непредвиденная ошибка при загрузке смен: {e}")
-        return []
+    """Возвращает смены из кэша shifts.json (файл перечитывается только при изменении)"""
+    return shift_repository.all()
 
 def format_datetime_for_google(dt: datetime) -> str:
     """Форматирует datetime для Google Calendar с учетом таймзоны"""
-    logger.debug(f"Форматирование даты {dt} с таймзоной {TIMEZONE}")
+    logger.debug("Форматирование даты %s с таймзоной %s", dt, TIMEZONE)
     if TIMEZONE == 'Asia/Yekaterinburg':
         return dt.strftime("%Y-%m-%dT%H:%M:%S+05:00")
     return dt.strftime("%Y-%m-%dT%H:%M:%S+00:00")
@@ -89,30 +61,58 @@ def is_next_week_shift(shift_date: datetime) -> bool:
     next_week_end = next_week_start + timedelta(days=6)
     
     is_next = next_week_start.date() <= shift_date.date() <= next_week_end.date()
-    logger.debug(f"Проверка смены на {shift_date.date()}: следующая неделя - {is_next}")
+    logger.debug("Проверка смены на %s: следующая неделя - %s", shift_date.date(), is_next)
     return is_next
 
+def parse_shift_times(shift: dict):
+    """Возвращает начало и конец смены как datetime"""
+    start_dt = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S')
+    end_dt = datetime.strptime(shift['end_time'], '%Y-%m-%d %H:%M:%S')
+    return start_dt, end_dt
+
+def build_shift_event(shift: dict, start_dt: datetime, end_dt: datetime) -> dict:
+    """Собирает тело события календаря для смены"""
+    return {
+        'summary': f"Смена: {shift['employee_name']}",
+        'description': shift.get('description', ''),
+        'start': {'dateTime': format_datetime_for_google(start_dt), 'timeZone': TIMEZONE},
+        'end': {'dateTime': format_datetime_for_google(end_dt), 'timeZone': TIMEZONE}
+    }
+
+def event_needs_update(existing: dict, event: dict) -> bool:
+    """Проверяет, отличаются ли время или описание существующего события от нового"""
+    return (existing['start'].get('dateTime') != event['start']['dateTime'] or
+            existing['end'].get('dateTime') != event['end']['dateTime'] or
+            (existing.get('description') or '') != (event.get('description') or ''))
+
+def event_search_request(service, summary: str, start_dt: datetime):
+    """Готовит запрос поиска события по названию в пределах дня смены"""
+    start = format_datetime_for_google(start_dt.replace(hour=0, minute=0, second=0))
+    end = format_datetime_for_google(start_dt.replace(hour=23, minute=59, second=59))
+
+    return service.events().list(
+        calendarId=CALENDAR_ID,
+        timeMin=start,
+        timeMax=end,
+        q=summary,
+        singleEvents=True,
+        timeZone=TIMEZONE
+    )
+
+def pick_matching_event(events_result: dict, summary: str):
+    """Выбирает из результата поиска событие с точным совпадением названия"""
+    events = events_result.get('items', [])
+    return next((ev for ev in events if ev.get('summary') == summary), None)
+
 def find_existing_event(service, summary: str, start_dt: datetime):
     """Ищет существующее событие в календаре"""
-    logger.debug(f"Поиск события '{summary}' на {start_dt}")
+    logger.debug("Поиск события '%s' на %s", summary, start_dt)
     try:
-        start = format_datetime_for_google(start_dt.replace(hour=0, minute=0, second=0))
-        end = format_datetime_for_google(start_dt.replace(hour=23, minute=59, second=59))
-        
-        events_result = service.events().list(
-            calendarId=CALENDAR_ID,
-            timeMin=start,
-            timeMax=end,
-            q=summary,
-            singleEvents=True,
-            timeZone=TIMEZONE
-        ).execute()
-        
-        events = events_result.get('items', [])
-        found_event = next((ev for ev in events if ev.get('summary') == summary), None)
+        events_result = execute(event_search_request(service, summary, start_dt))
+        found_event = pick_matching_event(events_result, summary)
         
         if found_event:
-            logger.debug(f"Найдено существующее событие: {found_event.get('id')}")
+            logger.debug("Найдено существующее событие: %s", found_event.get('id'))
         else:
             logger.debug("Существующее событие не найдено")
             
@@ -121,52 +121,281 @@ def find_existing_event(service, summary: str, start_dt: datetime):
         logger.error(f"Ошибка при поиске события: {e}")
         return None
 
-def upsert_shift_event(service, shift: dict, force: bool = False):
-    """Создает или обновляет событие смены в календаре"""
-    logger.debug(f"Обработка смены: {shift.get('employee_name')} (force={force})")
+def make_shift_event_id(shift: dict, start_dt: datetime) -> str:
+    """Строит стабильный ID события из сотрудника, заведения и даты смены
+
+    Google Calendar принимает ID из символов base32hex (0-9, a-v) длиной 5-1024,
+    поэтому берется sha1 ключа в кодировке base32hex: 32 символа без паддинга.
+    """
+    key = f"{shift['employee_name']}|{shift.get('shift_name', '')}|{start_dt.strftime('%Y-%m-%d')}"
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return base64.b32hexencode(digest).decode('ascii').rstrip('=').lower()
+
+def event_fingerprint(event: dict) -> str:
+    """Возвращает хэш содержимого события для обнаружения изменений без чтения календаря"""
+    payload = json.dumps(event, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def load_event_state(path: str = CALENDAR_STATE_PATH) -> dict:
+    """Загружает последние записанные версии событий: event_id -> {hash, etag, calendar_id, summary, date}"""
+    if not os.path.exists(path):
+        return {}
     try:
-        start_dt = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S')
-        end_dt = datetime.strptime(shift['end_time'], '%Y-%m-%d %H:%M:%S')
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать состояние событий {path}: {e}")
+        return {}
 
-        if not force:
-            next_week_start = datetime.now() - timedelta(days=datetime.now().weekday()) + timedelta(weeks=1)
-            next_week_end = next_week_start + timedelta(days=6)
-            
-            if not (next_week_start.date() <= start_dt.date() <= next_week_end.date()):
-                logger.info(f"Пропуск смены {shift['employee_name']} - не следующая неделя")
-                return
-
-        summary = f"Смена: {shift['employee_name']}"
-        description = shift.get('description', '')
-
-        event = {
-            'summary': summary,
-            'description': description,
-            'start': {'dateTime': format_datetime_for_google(start_dt), 'timeZone': TIMEZONE},
-            'end': {'dateTime': format_datetime_for_google(end_dt), 'timeZone': TIMEZONE}
-        }
-
-        existing = find_existing_event(service, summary, start_dt)
-
-        if existing:
-            if (existing['start'].get('dateTime') != event['start']['dateTime'] or
-                existing['end'].get('dateTime') != event['end']['dateTime']):
-                logger.debug(f"Обновление существующего события {existing['id']}")
-                result = service.events().update(
-                    calendarId=CALENDAR_ID,
-                    eventId=existing['id'],
-                    body=event
-                ).execute()
-                logger.info(f"Смена обновлена в календаре: {result.get('htmlLink')}")
-            else:
-                logger.info(f"Смена {shift['employee_name']} на {start_dt} не требует обновления")
-        else:
-            logger.debug("Создание нового события")
-            result = service.events().insert(
-                calendarId=CALENDAR_ID,
-                body=event
-            ).execute()
-            logger.info(f"Смена добавлена в календарь: {result.get('htmlLink')}")
+_event_state_lock = threading.Lock()
+
+def save_event_state(state: dict, path: str = CALENDAR_STATE_PATH, removed=()) -> None:
+    """Сохраняет состояние событий атомарно (временный файл и os.replace)
+
+    Состояние сливается с уже записанным под блокировкой: загрузки в разные
+    календари идут параллельно и сохраняют каждая свои события.
+
+    Args:
+        removed (iterable): ID удаленных из календаря событий, которые нужно забыть
+    """
+    try:
+        with _event_state_lock:
+            merged = {**load_event_state(path), **state}
+            for event_id in removed:
+                merged.pop(event_id, None)
+            atomic_write_json(path, merged)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении состояния событий в {path}: {e}")
+
+def remember_event(state: dict, event_id: str, event: dict, result: dict, calendar_id: str = CALENDAR_ID) -> None:
+    """Запоминает хэш и ETag записанного события, а также его календарь и дату для удаления"""
+    state[event_id] = {
+        'hash': event_fingerprint(event),
+        'etag': result.get('etag'),
+        'calendar_id': calendar_id,
+        'summary': event.get('summary'),
+        'date': event['start']['dateTime'][:10]
+    }
+
+def conditional_update_event(service, event_id: str, event: dict, etag: str = None,
+                             calendar_id: str = CALENDAR_ID):
+    """Обновляет событие с проверкой ETag (If-Match)
+
+    Без известного ETag событие сначала читается; если оно не изменилось,
+    запись пропускается. При 412 (событие изменили параллельно) выполняется
+    одна повторная попытка со свежим ETag.
+
+    Returns:
+        tuple: (актуальное событие, 'updated' или 'unchanged')
+    """
+    limiters = (get_calendar_limiter(calendar_id),)
+    for attempt in range(2):
+        if etag is None:
+            current = execute(service.events().get(calendarId=calendar_id, eventId=event_id), limiters=limiters)
+            if current.get('status') != 'cancelled' and not event_needs_update(current, event):
+                return current, 'unchanged'
+            etag = current.get('etag')
+
+        request = service.events().update(
+            calendarId=calendar_id,
+            eventId=event_id,
+            body={**event, 'status': 'confirmed'}
+        )
+        if etag:
+            request.headers['If-Match'] = etag
+        try:
+            return execute(request, limiters=limiters), 'updated'
+        except HttpError as e:
+            if e.resp.status != 412 or attempt:
+                raise
+            logger.debug("ETag события %s устарел, перечитываю", event_id)
+            etag = None
+
+def upsert_shift_event(service, shift: dict, force: bool = False, event_state: dict = None,
+                       calendar_id: str = CALENDAR_ID):
+    """Создает или обновляет событие смены в календаре
+
+    Событие пишется сразу под детерминированным ID без предварительного поиска;
+    только при 409 выполняется условное обновление по ETag. Смены, хэш которых
+    совпадает с последней записанной версией, не требуют ни одного запроса;
+    при force событие сверяется с календарем независимо от хэша.
+
+    Args:
+        event_state (dict): общее состояние событий на время цикла загрузки;
+            если не передано, загружается и сохраняется для одной смены
+
+    Returns:
+        str | None: 'created', 'updated', 'unchanged' или None для пропущенной смены
+    """
+    logger.debug("Обработка смены: %s (force=%s)", shift.get('employee_name'), force)
+    try:
+        start_dt, end_dt = parse_shift_times(shift)
+
+        if not force and not is_next_week_shift(start_dt):
+            logger.info("Пропуск смены %s - не следующая неделя", shift['employee_name'])
+            return None
+
+        state = event_state if event_state is not None else load_event_state()
+        event = build_shift_event(shift, start_dt, end_dt)
+        event_id = make_shift_event_id(shift, start_dt)
+        cached = state.get(event_id)
+
+        if not force and cached and cached.get('hash') == event_fingerprint(event):
+            logger.info("Смена %s на %s не требует обновления", shift['employee_name'], start_dt)
+            return 'unchanged'
+
+        try:
+            result = execute(
+                service.events().insert(calendarId=calendar_id, body={**event, 'id': event_id}),
+                limiters=(get_calendar_limiter(calendar_id),)
+            )
+            action = 'created'
+            logger.info("Смена добавлена в календарь: %s", result.get('htmlLink'))
+        except HttpError as e:
+            if e.resp.status != 409:
+                raise
+            logger.debug("Событие %s уже существует, условное обновление", event_id)
+            result, action = conditional_update_event(
+                service, event_id, event, etag=cached.get('etag') if cached and not force else None,
+                calendar_id=calendar_id
+            )
+            logger.info("Смена %s на %s: %s", shift['employee_name'], start_dt, action)
+
+        remember_event(state, event_id, event, result, calendar_id)
+        if event_state is None:
+            save_event_state(state)
+        return action
     except Exception as e:
         logger.error(f"Ошибка при обработке смены {shift.get('employee_name')}: {e}")
         raise
+
+def upsert_shift_events(service, shifts: list, force: bool = False, batch: bool = True,
+                        calendar_id: str = CALENDAR_ID, progress=None, window: tuple = None) -> dict:
+    """Загружает смены напрямую по детерминированным ID без чтения календаря
+
+    Изменившиеся смены вставляются (batch-запросами или по одной), а на 409
+    выполняется условное обновление по ETag; при force хэш последней записанной
+    версии не учитывается. События календаря, записанные раньше в пределах
+    окна window, но уже не соответствующие ни одной смене (сменился сотрудник,
+    заведение или дата), удаляются по состоянию событий, как в режиме сверки.
+    Без окна или при сменах с ошибкой разбора удаление пропускается.
+
+    Args:
+        window (tuple): окно (datetime, datetime), в котором удаляются устаревшие события
+
+    Returns:
+        dict: счетчики created/updated/deleted/unchanged/skipped/failed и список items
+    """
+    report = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0, 'items': []}
+    state = load_event_state()
+
+    def record(shift, action, error=None):
+        report['items'].append({
+            'employee_name': shift.get('employee_name'),
+            'start_time': shift.get('start_time'),
+            'action': action,
+            'status': 'error' if error else 'ok',
+            'error': str(error) if error else None
+        })
+        report['failed' if error else action] += 1
+
+    pending = {}
+    desired_ids = set()
+    invalid = 0
+    for index, shift in enumerate(shifts):
+        try:
+            start_dt, end_dt = parse_shift_times(shift)
+        except Exception as e:
+            logger.error(f"Некорректное время смены {shift.get('employee_name')}: {e}")
+            record(shift, 'parse', e)
+            invalid += 1
+            continue
+        event_id = make_shift_event_id(shift, start_dt)
+        desired_ids.add(event_id)
+        if not force and not is_next_week_shift(start_dt):
+            record(shift, 'skipped')
+            continue
+
+        event = build_shift_event(shift, start_dt, end_dt)
+        cached = state.get(event_id)
+        if not force and cached and cached.get('hash') == event_fingerprint(event):
+            record(shift, 'unchanged')
+            continue
+        pending[str(index)] = {'shift': shift, 'event': event, 'event_id': event_id, 'cached': cached}
+
+    if window and CALENDAR_DELETE_STALE:
+        if invalid:
+            logger.warning(f"Удаление устаревших событий пропущено: смен с ошибкой разбора {invalid}")
+        else:
+            first, last = (bound.strftime('%Y-%m-%d') for bound in window)
+            for event_id, entry in state.items():
+                if (entry.get('calendar_id') == calendar_id and first <= (entry.get('date') or '') < last
+                        and event_id not in desired_ids):
+                    pending[f"delete:{event_id}"] = {'event_id': event_id, 'entry': entry, 'delete': True}
+
+    def write_request(item):
+        if item.get('delete'):
+            return service.events().delete(calendarId=calendar_id, eventId=item['event_id'])
+        return service.events().insert(calendarId=calendar_id, body={**item['event'], 'id': item['event_id']})
+
+    on_chunk = (lambda done, total: progress('write', done, total)) if progress else None
+    if progress:
+        progress('write', 0, len(pending))
+
+    if batch:
+        results = execute_batched(
+            service, pending, write_request,
+            on_chunk=on_chunk,
+            limiter=get_calendar_limiter(calendar_id)
+        )
+    else:
+        results = {}
+        for key, item in pending.items():
+            try:
+                response = execute(write_request(item), limiters=(get_calendar_limiter(calendar_id),))
+                results[key] = {'response': response, 'error': None}
+            except Exception as e:
+                results[key] = {'response': None, 'error': e}
+            if on_chunk:
+                on_chunk(len(results), len(pending))
+
+    removed = []
+    for key, result in results.items():
+        item = pending[key]
+        error = result['error']
+        if item.get('delete'):
+            entry = item['entry']
+            gone = isinstance(error, HttpError) and error.resp.status in (404, 410)
+            if error is None or gone:
+                removed.append(item['event_id'])
+            else:
+                logger.error(f"Ошибка удаления события {item['event_id']}: {error}")
+            record({'employee_name': entry.get('summary'), 'start_time': entry.get('date')}, 'deleted',
+                   None if gone else error)
+            continue
+        try:
+            if error is None:
+                response, action = result['response'], 'created'
+            elif isinstance(error, HttpError) and error.resp.status == 409:
+                cached = item['cached']
+                response, action = conditional_update_event(
+                    service, item['event_id'], item['event'],
+                    etag=cached.get('etag') if cached and not force else None, calendar_id=calendar_id
+                )
+            else:
+                raise error
+            remember_event(state, item['event_id'], item['event'], response, calendar_id)
+            record(item['shift'], action)
+        except Exception as e:
+            logger.error(f"Ошибка записи смены {item['shift'].get('employee_name')}: {e}")
+            record(item['shift'], 'write', e)
+
+    for event_id in removed:
+        state.pop(event_id, None)
+    save_event_state(state, removed=removed)
+    logger.info(
+        f"Прямая загрузка завершена: создано {report['created']}, обновлено {report['updated']}, "
+        f"удалено {report['deleted']}, без изменений {report['unchanged']}, пропущено {report['skipped']}, "
+        f"ошибок {report['failed']}"
+    )
+    return report
@@ -0,0 +1,92 @@
+import time
+import logging
+from shared.config import CALENDAR_BATCH_SIZE, CALENDAR_BATCH_RETRIES
+from shared.google_requests import (
+    CircuitOpenError,
+    is_retryable_error,
+    is_rate_limited,
+    backoff_delay,
+    get_api_limiter,
+    get_breaker
+)
+
+from shared.metrics import GOOGLE_API_SECONDS, GOOGLE_API_ERRORS, error_class
+
+logger = logging.getLogger('barhub')
+
+def execute_batched(service, items: dict, make_request, on_chunk=None, limiter=None) -> dict:
+    """Выполняет запросы пачками по CALENDAR_BATCH_SIZE и повторяет только упавшие
+
+    Args:
+        items (dict): ключ запроса -> данные для make_request
+        make_request (callable): строит HttpRequest по данным элемента
+        on_chunk (callable): вызывается после каждой пачки с (успешно выполнено, всего)
+        limiter (TokenBucket): квота календаря; каждый запрос пачки расходует токен
+
+    Returns:
+        dict: ключ -> {'response': ответ API или None, 'error': исключение или None}
+    """
+    results = {}
+    pending = list(items)
+    api_limiter = get_api_limiter('calendar')
+    breaker = get_breaker('calendar')
+
+    for attempt in range(CALENDAR_BATCH_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            errors = [results[key]['error'] for key in pending]
+            delay = max(backoff_delay(attempt, error) for error in errors)
+            if any(is_rate_limited(error) for error in errors):
+                api_limiter.penalize(delay)
+            logger.warning(f"Повтор {len(pending)} запросов пачкой через {delay:.1f} с (попытка {attempt + 1})")
+            time.sleep(delay)
+
+        for offset in range(0, len(pending), CALENDAR_BATCH_SIZE):
+            chunk = pending[offset:offset + CALENDAR_BATCH_SIZE]
+
+            try:
+                breaker.before_request()
+            except CircuitOpenError as e:
+                # Предохранитель открыт: оставшиеся пачки не отправляются и не влияют на его счетчики
+                rejected = pending[offset:]
+                logger.error(f"Не отправлено {len(rejected)} запросов: {e}")
+                for key in rejected:
+                    results[key] = {'response': None, 'error': e}
+                break
+
+            def callback(request_id, response, exception):
+                results[request_id] = {'response': response, 'error': exception}
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key in chunk:
+                batch.add(make_request(items[key]), request_id=key)
+
+            try:
+                api_limiter.acquire(len(chunk))
+                if limiter is not None:
+                    limiter.acquire(len(chunk))
+                with GOOGLE_API_SECONDS.time(api='calendar', method='batch'):
+                    batch.execute()
+            except Exception as e:
+                logger.error(f"Ошибка при выполнении пачки из {len(chunk)} запросов: {e}")
+                for key in chunk:
+                    results[key] = {'response': None, 'error': e}
+
+            chunk_errors = [results[key]['error'] for key in chunk if results[key]['error'] is not None]
+            for error in chunk_errors:
+                GOOGLE_API_ERRORS.inc(api='calendar', method='batch', error=error_class(error))
+            if any(is_retryable_error(error) for error in chunk_errors):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if on_chunk is not None:
+                on_chunk(sum(1 for result in results.values() if result['error'] is None), len(items))
+
+        pending = [
+            key for key in pending
+            if results[key]['error'] is not None and is_retryable_error(results[key]['error'])
+        ]
+
+    return results
@@ -1,4 +1,5 @@
 import os
+import hashlib
 from dotenv import load_dotenv
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,16 +14,118 @@ GOOGLE_CREDS_PATH = os.path.join(DATA_DIR, 'creds.json')
 USER_DB_PATH = os.path.join(DATA_DIR, 'users.json')
 SHIFTS_DB_PATH = os.path.join(DATABASE_DIR, 'shifts.json')
 EMPLOYEES_DB_PATH = os.path.join(DATABASE_DIR, 'employees.json')
+CALENDAR_STATE_PATH = os.path.join(DATABASE_DIR, 'calendar_state.json')
+SYNC_STATE_PATH = os.path.join(DATABASE_DIR, 'sync_state.json')
+SCHEDULER_STATE_PATH = os.path.join(DATABASE_DIR, 'scheduler_state.json')
 LOG_FILE_PATH = os.path.join(LOGS_DIR, 'barhub.log')
+DEBOT_LOG_PATH = os.path.join(LOGS_DIR, 'debot.log')
+DEBOT_STATE_PATH = os.path.join(DATABASE_DIR, 'debot_state.json')
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')  # json | sqlite
+SQLITE_DB_PATH = os.path.join(DATABASE_DIR, os.getenv('SQLITE_DB_NAME', 'barhub.sqlite3'))
+# Состояния FSM бота: sqlite — общий файл для нескольких процессов бота, memory — в памяти процесса
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'sqlite')  # sqlite | memory
+FSM_DB_PATH = os.path.join(DATABASE_DIR, os.getenv('FSM_DB_NAME', 'fsm.sqlite3'))
 
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 CALENDAR_ID = os.getenv('CALENDAR_ID')
 
+# Получение обновлений Telegram: polling (getUpdates) или webhook (встроенный aiohttp-сервер)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # polling | webhook
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')  # публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+# По умолчанию секрет выводится из токена: одинаков у всех процессов бота
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(
+    f"barhub-webhook:{TELEGRAM_TOKEN or ''}".encode('utf-8')
+).hexdigest()
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_CONCURRENCY = max(int(os.getenv('WEBHOOK_CONCURRENCY', '32')), 1)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# SO_REUSEPORT: несколько процессов бота слушают один порт за обратным прокси
+WEBHOOK_REUSE_PORT = os.getenv('WEBHOOK_REUSE_PORT', '0') == '1'
+# Регистрировать webhook в Telegram при старте (достаточно одного процесса)
+WEBHOOK_REGISTER = os.getenv('WEBHOOK_REGISTER', '1') == '1'
+# Планировщик синхронизации запускается только в одном процессе
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') == '1'
+
 SPREADSHEET_URL = 'https://docs.google.com/spreadsheets/d/1d8dCGCC7Gx0MQnPAWVr9ny9jOg9Tq5yQOro8yh3aZms/edit?usp=sharing'
 SPREADSHEET_ID = '1d8dCGCC7Gx0MQnPAWVr9ny9jOg9Tq5yQOro8yh3aZms'  # оставляем для обратной совместимости
 
 TIMEZONE = os.getenv('TIMEZONE', 'Asia/Yekaterinburg')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text | json
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+# Метрики: локальный endpoint /metrics (0 — выключен) и/или периодическая запись в файл
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_DUMP_PATH = os.getenv('METRICS_DUMP_PATH', '')
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', '30'))
+
+GOOGLE_HTTP_TIMEOUT = int(os.getenv('GOOGLE_HTTP_TIMEOUT', '30'))
+# Локальный эмулятор Sheets/Drive/Calendar (python -m bench.emulator), например http://127.0.0.1:8085
+GOOGLE_EMULATOR_URL = os.getenv('GOOGLE_EMULATOR_URL', '').rstrip('/')
+SHEETS_SESSION_TTL = int(os.getenv('SHEETS_SESSION_TTL', '600'))
+CALENDAR_BATCH_MODE = os.getenv('CALENDAR_BATCH_MODE', '1') == '1'
+CALENDAR_BATCH_SIZE = min(int(os.getenv('CALENDAR_BATCH_SIZE', '50')), 50)
+CALENDAR_BATCH_RETRIES = int(os.getenv('CALENDAR_BATCH_RETRIES', '3'))
+CALENDAR_DELETE_STALE = os.getenv('CALENDAR_DELETE_STALE', '1') == '1'
+CALENDAR_SYNC_MODE = os.getenv('CALENDAR_SYNC_MODE', 'reconcile')  # reconcile | direct
+
+def _parse_mapping(value: str) -> dict:
+    """Разбирает строку вида 'брудер=id1,дайнер=id2' в словарь"""
+    mapping = {}
+    for item in (value or '').split(','):
+        key, sep, target = item.partition('=')
+        if sep and key.strip() and target.strip():
+            mapping[key.strip().lower()] = target.strip()
+    return mapping
+
+# Календарь заведения: VENUE_CALENDARS='брудер=...@group.calendar.google.com,дайнер=...'
+VENUE_CALENDARS = _parse_mapping(os.getenv('VENUE_CALENDARS', ''))
+CALENDAR_PARALLELISM = int(os.getenv('CALENDAR_PARALLELISM', '4'))
+CALENDAR_MAX_CONCURRENCY = int(os.getenv('CALENDAR_MAX_CONCURRENCY', '1'))
+CALENDAR_QPS = float(os.getenv('CALENDAR_QPS', '5'))
+CALENDAR_BURST = float(os.getenv('CALENDAR_BURST', '50'))
+# Пользовательские квоты Google: Calendar ~600 запросов/мин, Sheets — 60 чтений/мин
+CALENDAR_USER_QPS = float(os.getenv('CALENDAR_USER_QPS', '10'))
+CALENDAR_USER_BURST = float(os.getenv('CALENDAR_USER_BURST', '50'))
+SHEETS_QPS = float(os.getenv('SHEETS_QPS', '1'))
+SHEETS_BURST = float(os.getenv('SHEETS_BURST', '10'))
+GOOGLE_RETRIES = int(os.getenv('GOOGLE_RETRIES', '5'))
+GOOGLE_BACKOFF_BASE = float(os.getenv('GOOGLE_BACKOFF_BASE', '1'))
+GOOGLE_BACKOFF_MAX = float(os.getenv('GOOGLE_BACKOFF_MAX', '64'))
+GOOGLE_BREAKER_THRESHOLD = int(os.getenv('GOOGLE_BREAKER_THRESHOLD', '5'))
+GOOGLE_BREAKER_RESET = float(os.getenv('GOOGLE_BREAKER_RESET', '60'))
+
+SHEET_CHANGE_DETECTION = os.getenv('SHEET_CHANGE_DETECTION', '1') == '1'
+
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '4'))
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', '4'))
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '1.5'))
+# 0 — привязка пользователя записывается сразу (обязательно, если процессов бота несколько);
+# больше 0 — изменения одного процесса объединяются и записываются через столько секунд
+USER_DB_FLUSH_DELAY = float(os.getenv('USER_DB_FLUSH_DELAY', '0'))
+# Выбор сотрудника: до EMPLOYEE_PAGE_SIZE человек — один список, иначе алфавит и страницы
+EMPLOYEE_PAGE_SIZE = max(int(os.getenv('EMPLOYEE_PAGE_SIZE', '10')), 1)
+
+# Мониторинг логов (debot): размер чтения за раз, лимит на одну обработку и период опроса
+DEBOT_CHUNK_SIZE = int(os.getenv('DEBOT_CHUNK_SIZE', str(64 * 1024)))
+DEBOT_MAX_BATCH_BYTES = int(os.getenv('DEBOT_MAX_BATCH_BYTES', str(4 * 1024 * 1024)))
+DEBOT_FLUSH_INTERVAL = float(os.getenv('DEBOT_FLUSH_INTERVAL', '2'))
+
+# Еженедельная синхронизация (по умолчанию пятница 18:00) и опрос таблицы
+SYNC_WEEKDAY = int(os.getenv('SYNC_WEEKDAY', '4'))
+SYNC_TIME = os.getenv('SYNC_TIME', '18:00')
+SCHEDULER_JITTER = float(os.getenv('SCHEDULER_JITTER', '60'))
+SCHEDULER_CATCH_UP = float(os.getenv('SCHEDULER_CATCH_UP', str(2 * 24 * 3600)))
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '120'))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '1800'))
+POLL_BACKOFF = float(os.getenv('POLL_BACKOFF', '2'))
+# Окно публикации графика вокруг SYNC_TIME (часы до и после), в нем опрос самый частый
+PUBLICATION_WINDOW_BEFORE = float(os.getenv('PUBLICATION_WINDOW_BEFORE', '6'))
+PUBLICATION_WINDOW_AFTER = float(os.getenv('PUBLICATION_WINDOW_AFTER', '6'))
 
 required_vars = [
     ('TELEGRAM_TOKEN', TELEGRAM_TOKEN),
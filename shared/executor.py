@@ -0,0 +1,59 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from shared.config import SYNC_WORKERS, CALENDAR_PARALLELISM
+
+logger = logging.getLogger('barhub')
+
+_executor = None
+_calendar_executor = None
+_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Возвращает общий пул потоков для блокирующих вызовов Google API и диска"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix='barhub-sync')
+                logger.debug("Создан пул синхронизации на %s потоков", SYNC_WORKERS)
+    return _executor
+
+def get_calendar_executor() -> ThreadPoolExecutor:
+    """Возвращает пул потоков синхронизации календарей
+
+    Пул живет все время работы приложения, поэтому клиенты Calendar API,
+    закэшированные в потоках, переиспользуются между загрузками. Пул отдельный
+    от get_executor(): загрузка сама выполняется в общем пуле и ждет календари.
+    """
+    global _calendar_executor
+    if _calendar_executor is None:
+        with _lock:
+            if _calendar_executor is None:
+                _calendar_executor = ThreadPoolExecutor(max_workers=max(1, CALENDAR_PARALLELISM),
+                                                        thread_name_prefix='barhub-calendar')
+                logger.debug("Создан пул календарей на %s потоков", CALENDAR_PARALLELISM)
+    return _calendar_executor
+
+async def run_blocking(func, *args, **kwargs):
+    """Выполняет синхронную функцию в пуле потоков, не блокируя цикл событий бота
+
+    Через эту функцию должны идти все синхронные точки входа (gspread,
+    googleapiclient), вызываемые из корутин и обработчиков aiogram.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor(wait: bool = True):
+    """Останавливает пулы потоков при завершении приложения"""
+    global _executor, _calendar_executor
+    with _lock:
+        executor, _executor = _executor, None
+        calendar_executor, _calendar_executor = _calendar_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("Пул синхронизации остановлен")
+    if calendar_executor is not None:
+        calendar_executor.shutdown(wait=wait, cancel_futures=True)
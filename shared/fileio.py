@@ -0,0 +1,54 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+def atomic_write_text(path: str, text: str) -> None:
+    """Записывает текст через временный файл в той же директории и os.replace
+
+    При падении процесса посреди записи на диске остается либо старая,
+    либо новая версия файла, но не обрезанная.
+    """
+    dir_path = os.path.dirname(path) or '.'
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def atomic_write_json(path: str, data, indent=None) -> None:
+    """Записывает JSON атомарно (см. atomic_write_text)"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+@contextmanager
+def file_lock(path: str):
+    """Эксклюзивная блокировка файла для read-modify-write из нескольких процессов
+
+    Блокируется соседний файл <path>.lock: сам файл заменяется через
+    os.replace, и блокировка на нем осталась бы на старом inode.
+    """
+    if fcntl is None:
+        yield
+        return
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
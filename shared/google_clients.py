@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import threading
+import logging
+import gspread
+import gspread.urls
+import gspread.http_client
+import httplib2
+import requests
+import google_auth_httplib2
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from shared.google_requests import call
+from shared.config import (
+    GOOGLE_CREDS_PATH, GOOGLE_HTTP_TIMEOUT, SPREADSHEET_URL, SHEETS_SESSION_TTL, GOOGLE_EMULATOR_URL
+)
+
+logger = logging.getLogger('barhub')
+
+CALENDAR_SCOPES = ['https://www.googleapis.com/auth/calendar']
+SHEETS_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+_lock = threading.Lock()
+_credentials = {}
+_local = threading.local()
+_generation = 0
+_sheets_lock = threading.Lock()
+_sheets_session = None
+
+GOOGLE_API_HOSTS = ('https://sheets.googleapis.com', 'https://www.googleapis.com')
+
+def _use_emulator() -> None:
+    """Перенаправляет URL-константы gspread на GOOGLE_EMULATOR_URL"""
+    for module in (gspread.urls, gspread.http_client):
+        for name, value in list(vars(module).items()):
+            if name.endswith('_URL') and isinstance(value, str) and value.startswith(GOOGLE_API_HOSTS):
+                host = next(prefix for prefix in GOOGLE_API_HOSTS if value.startswith(prefix))
+                setattr(module, name, GOOGLE_EMULATOR_URL + value[len(host):])
+
+if GOOGLE_EMULATOR_URL:
+    _use_emulator()
+    logger.warning(f"Google API перенаправлены на эмулятор {GOOGLE_EMULATOR_URL}")
+
+def get_credentials(scopes: list) -> Credentials:
+    """Возвращает учетные данные сервисного аккаунта, загруженные один раз на процесс
+
+    Токен доступа переиспользуется, пока не истечет: обновление выполняет
+    транспорт google-auth перед запросом, когда credentials.valid == False.
+    """
+    if GOOGLE_EMULATOR_URL:
+        return AnonymousCredentials()
+
+    key = tuple(sorted(scopes))
+    creds = _credentials.get(key)
+    if creds is not None:
+        return creds
+
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is None:
+            if not os.path.exists(GOOGLE_CREDS_PATH):
+                logger.error(f"Не найден файл авторизации: {GOOGLE_CREDS_PATH}")
+                raise FileNotFoundError("Google credentials file not found")
+            logger.debug("Загрузка учетных данных из %s для %s", GOOGLE_CREDS_PATH, key)
+            creds = Credentials.from_service_account_file(GOOGLE_CREDS_PATH, scopes=list(key))
+            _credentials[key] = creds
+    return creds
+
+def _authorized_http(creds: Credentials):
+    """Создает keep-alive HTTP транспорт с авторизацией"""
+    return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+
+def get_calendar_service():
+    """Возвращает долгоживущий клиент Google Calendar API для текущего потока
+
+    httplib2 не потокобезопасен, поэтому каждый рабочий поток получает свой
+    транспорт из пула, а учетные данные и токен общие для всего процесса.
+    Клиент создается один раз и затем переиспользуется между циклами загрузки.
+    """
+    service = getattr(_local, 'calendar_service', None)
+    if service is not None and _local.generation == _generation:
+        return service
+
+    try:
+        if GOOGLE_EMULATOR_URL:
+            service = _build_emulated_calendar()
+        else:
+            creds = get_credentials(CALENDAR_SCOPES)
+            service = build('calendar', 'v3', http=_authorized_http(creds), cache_discovery=False)
+    except Exception as e:
+        logger.error(f"Ошибка при создании сервиса календаря: {str(e)}")
+        raise
+
+    _local.calendar_service = service
+    _local.generation = _generation
+    logger.info(f"Google Calendar API авторизован (поток {threading.current_thread().name})")
+    return service
+
+def _build_emulated_calendar():
+    """Клиент Calendar v3 без авторизации с rootUrl эмулятора (включая batch)"""
+    document = json.loads(get_static_doc('calendar', 'v3'))
+    document['rootUrl'] = GOOGLE_EMULATOR_URL + '/'
+    return build_from_document(document, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+
+def _open_sheets_session(url: str) -> dict:
+    creds = get_credentials(SHEETS_SCOPES)
+    if GOOGLE_EMULATOR_URL:
+        client = gspread.Client(None, session=requests.Session())
+        client.set_timeout(GOOGLE_HTTP_TIMEOUT)
+    else:
+        client = gspread.authorize(creds)
+    spreadsheet = call(client.open_by_url, url, description='spreadsheets.get')
+    logger.info(f"Сессия Google Sheets открыта: {spreadsheet.title}")
+    return {
+        'creds': creds,
+        'client': client,
+        'spreadsheet': spreadsheet,
+        'worksheets': call(spreadsheet.worksheets, description='spreadsheets.get'),
+        'loaded_at': time.monotonic(),
+        'modified_time': None,
+        'generation': _generation
+    }
+
+def refresh_worksheets(session: dict) -> None:
+    """Перечитывает список листов открытой таблицы"""
+    session['worksheets'] = call(session['spreadsheet'].worksheets, description='spreadsheets.get')
+    session['loaded_at'] = time.monotonic()
+    logger.debug("Список листов обновлен: %s", len(session['worksheets']))
+
+def get_sheets_session(refresh: bool = False, url: str = SPREADSHEET_URL) -> dict:
+    """Возвращает кэшированную сессию Google Sheets
+
+    Сессия хранит авторизованный клиент gspread, открытую таблицу и список
+    листов. Токен обновляется по истечении, а список листов — по истечении
+    SHEETS_SESSION_TTL, при истекшем токене или по запросу (refresh=True).
+
+    Returns:
+        dict: creds, client, spreadsheet, worksheets, loaded_at, modified_time
+    """
+    global _sheets_session
+    with _sheets_lock:
+        session = _sheets_session
+        if session is None or session['generation'] != _generation:
+            session = _sheets_session = _open_sheets_session(url)
+            return session
+
+        if not session['creds'].valid:
+            logger.debug("Токен Google Sheets истек, обновляю")
+            session['creds'].refresh(Request())
+            refresh = True
+        if refresh or time.monotonic() - session['loaded_at'] > SHEETS_SESSION_TTL:
+            refresh_worksheets(session)
+        return session
+
+def invalidate_sheets_session():
+    """Сбрасывает сессию Google Sheets (например, после 404 на таблицу или лист)"""
+    global _sheets_session
+    with _sheets_lock:
+        _sheets_session = None
+    logger.info("Сессия Google Sheets сброшена")
+
+def reset_google_clients():
+    """Сбрасывает кэш учетных данных и клиентов (например, после замены creds.json)"""
+    global _generation
+    with _lock:
+        _credentials.clear()
+        _generation += 1
+    logger.info("Кэш клиентов Google API сброшен")
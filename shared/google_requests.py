@@ -0,0 +1,198 @@
+import time
+import random
+import logging
+import threading
+import httplib2
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+from shared.config import (
+    GOOGLE_RETRIES,
+    GOOGLE_BACKOFF_BASE,
+    GOOGLE_BACKOFF_MAX,
+    GOOGLE_BREAKER_THRESHOLD,
+    GOOGLE_BREAKER_RESET,
+    CALENDAR_USER_QPS,
+    CALENDAR_USER_BURST,
+    SHEETS_QPS,
+    SHEETS_BURST
+)
+from shared.rate_limit import TokenBucket
+from shared.metrics import GOOGLE_API_SECONDS, GOOGLE_API_ERRORS, error_class
+
+logger = logging.getLogger('barhub')
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'RATE_LIMIT_EXCEEDED')
+# Сетевые ошибки и таймауты (requests.ConnectionError и socket.timeout — подклассы OSError)
+TRANSIENT_ERRORS = (OSError, httplib2.HttpLib2Error, TransportError)
+
+class CircuitOpenError(Exception):
+    """API временно отключено предохранителем после серии ошибок"""
+
+class CircuitBreaker:
+    """Предохранитель: после threshold подряд временных ошибок запросы не
+    отправляются reset_timeout секунд, затем пропускается один пробный запрос
+    """
+
+    def __init__(self, name: str, threshold: int = GOOGLE_BREAKER_THRESHOLD,
+                 reset_timeout: float = GOOGLE_BREAKER_RESET):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'  # closed | open | half-open
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self.state != 'open':
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(f"{self.name}: запросы приостановлены еще на {remaining:.0f} с")
+            self.state = 'half-open'
+            logger.info(f"{self.name}: пробный запрос после паузы предохранителя")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != 'closed':
+                logger.info(f"{self.name}: предохранитель закрыт")
+            self.state = 'closed'
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half-open' or self._failures >= self.threshold:
+                if self.state != 'open':
+                    logger.error(f"{self.name}: {self._failures} ошибок подряд, запросы приостановлены "
+                                 f"на {self.reset_timeout:.0f} с")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+_lock = threading.Lock()
+_limiters = {}
+_breakers = {}
+
+API_QUOTAS = {
+    'calendar': (CALENDAR_USER_QPS, CALENDAR_USER_BURST),
+    'sheets': (SHEETS_QPS, SHEETS_BURST)
+}
+
+def get_api_limiter(api: str) -> TokenBucket:
+    """Возвращает ограничитель частоты, рассчитанный на пользовательскую квоту API"""
+    with _lock:
+        limiter = _limiters.get(api)
+        if limiter is None:
+            rate, burst = API_QUOTAS[api]
+            limiter = _limiters[api] = TokenBucket(rate, burst, name=api)
+        return limiter
+
+def get_breaker(api: str) -> CircuitBreaker:
+    """Возвращает предохранитель API"""
+    with _lock:
+        breaker = _breakers.get(api)
+        if breaker is None:
+            breaker = _breakers[api] = CircuitBreaker(api)
+        return breaker
+
+def error_status(error: Exception):
+    """Возвращает HTTP-статус ошибки googleapiclient или gspread"""
+    if isinstance(error, HttpError):
+        return error.resp.status
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def _error_content(error: Exception) -> str:
+    content = getattr(error, 'content', None)
+    if content is None:
+        content = getattr(getattr(error, 'response', None), 'text', '') or ''
+    return content.decode('utf-8', 'ignore') if isinstance(content, bytes) else str(content)
+
+def is_rate_limited(error: Exception) -> bool:
+    """Проверяет, что запрос отклонен из-за превышения квоты"""
+    status = error_status(error)
+    if status == 429:
+        return True
+    return status == 403 and any(reason in _error_content(error) for reason in RATE_LIMIT_REASONS)
+
+def is_retryable_error(error: Exception) -> bool:
+    """Проверяет, имеет ли смысл повторять запрос после ошибки"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = error_status(error)
+    if status is None:
+        return isinstance(error, TRANSIENT_ERRORS)
+    return status in RETRYABLE_STATUSES or is_rate_limited(error)
+
+def retry_after(error: Exception):
+    """Возвращает задержку из заголовка Retry-After в секундах или None"""
+    if isinstance(error, HttpError):
+        value = error.resp.get('retry-after')
+    else:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        value = headers.get('Retry-After')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    """Задержка перед повтором: Retry-After или экспонента с полным джиттером"""
+    hinted = retry_after(error) if error is not None else None
+    if hinted is not None:
+        return min(hinted, GOOGLE_BACKOFF_MAX)
+    return random.uniform(0, min(GOOGLE_BACKOFF_MAX, GOOGLE_BACKOFF_BASE * 2 ** attempt))
+
+def call(func, *args, api: str = 'sheets', limiters=(), cost: int = 1, description: str = None, **kwargs):
+    """Выполняет вызов Google API через ограничитель частоты, повторы и предохранитель
+
+    Временные ошибки (429, 403 rateLimitExceeded, 5xx, сеть) повторяются до
+    GOOGLE_RETRIES раз. При превышении квоты ограничитель API штрафуется на
+    время паузы, чтобы параллельные потоки тоже притормозили, а не усиливали
+    поток отказов.
+
+    Args:
+        api (str): 'calendar' или 'sheets' — квота и предохранитель
+        limiters (tuple): дополнительные ограничители (например, квота календаря)
+        cost (int): сколько запросов расходует вызов (размер batch)
+    """
+    name = description or getattr(func, '__qualname__', 'request')
+    limiter = get_api_limiter(api)
+    breaker = get_breaker(api)
+
+    for attempt in range(GOOGLE_RETRIES + 1):
+        breaker.before_request()
+        limiter.acquire(cost)
+        for extra in limiters:
+            extra.acquire(cost)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            GOOGLE_API_SECONDS.observe(time.perf_counter() - started, api=api, method=name)
+            GOOGLE_API_ERRORS.inc(api=api, method=name, error=error_class(e))
+            if not is_retryable_error(e):
+                if error_status(e) is not None:
+                    breaker.record_success()  # API ответило, ошибка в самом запросе
+                raise
+            breaker.record_failure()
+            if attempt == GOOGLE_RETRIES:
+                logger.error(f"{api}: {name} не выполнен после {attempt + 1} попыток: {e}")
+                raise
+            delay = backoff_delay(attempt, e)
+            if is_rate_limited(e):
+                limiter.penalize(delay)
+            logger.warning(f"{api}: {name} — временная ошибка ({error_status(e) or type(e).__name__}), "
+                           f"повтор через {delay:.1f} с (попытка {attempt + 2})")
+            time.sleep(delay)
+            continue
+        GOOGLE_API_SECONDS.observe(time.perf_counter() - started, api=api, method=name)
+        breaker.record_success()
+        return result
+
+def execute(request, api: str = 'calendar', limiters=(), cost: int = 1):
+    """Выполняет HttpRequest googleapiclient через общий слой повторов и квот"""
+    return call(request.execute, api=api, limiters=limiters, cost=cost,
+                description=getattr(request, 'methodId', None))
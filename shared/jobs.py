@@ -0,0 +1,131 @@
+import asyncio
+import itertools
+import logging
+from shared.config import JOB_PROGRESS_INTERVAL
+from shared.executor import run_blocking
+
+logger = logging.getLogger('barhub')
+
+MAX_FINISHED_JOBS = 50
+
+_ids = itertools.count(1)
+_jobs = {}
+_active = {}
+
+class SyncJob:
+    """Фоновая задача синхронизации с отчетом о ходе выполнения
+
+    Функция задачи выполняется в пуле потоков и получает аргумент progress;
+    подписчики (async-функции job -> None) уведомляются не чаще одного раза
+    в JOB_PROGRESS_INTERVAL секунд и всегда — при завершении.
+    """
+
+    def __init__(self, key, func, kwargs: dict):
+        self.id = next(_ids)
+        self.key = key
+        self.func = func
+        self.kwargs = kwargs
+        self.status = 'queued'  # queued | running | done | failed
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.subscribers = []
+        self.task = None
+        self._loop = None
+        self._notify_handle = None
+        self._last_notify = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def report_progress(self, stage: str, done: int = 0, total: int = 0):
+        """Обновляет прогресс; вызывается из рабочего потока"""
+        self.stage, self.done, self.total = stage, done, total
+        self._loop.call_soon_threadsafe(self._schedule_notify)
+
+    def _schedule_notify(self):
+        if self._notify_handle is not None or self.finished:
+            return
+        delay = max(0.0, JOB_PROGRESS_INTERVAL - (self._loop.time() - self._last_notify))
+        self._notify_handle = self._loop.call_later(delay, self._fire_notify)
+
+    def _fire_notify(self):
+        self._notify_handle = None
+        self._last_notify = self._loop.time()
+        self._loop.create_task(self._notify())
+
+    async def _notify(self):
+        for subscriber in list(self.subscribers):
+            try:
+                await subscriber(self)
+            except Exception as e:
+                logger.warning(f"Ошибка при уведомлении о задаче #{self.id}: {e}")
+
+    async def _run(self):
+        self.status = 'running'
+        logger.info(f"Задача #{self.id} {self.key} запущена")
+        await self._notify()
+        try:
+            self.result = await run_blocking(self.func, progress=self.report_progress, **self.kwargs)
+            self.status = 'done'
+            logger.info(f"Задача #{self.id} {self.key} завершена")
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            logger.error(f"Задача #{self.id} {self.key} завершилась с ошибкой: {e}")
+        finally:
+            if _active.get(self.key) is self:
+                del _active[self.key]
+            if self._notify_handle is not None:
+                self._notify_handle.cancel()
+                self._notify_handle = None
+            await self._notify()
+        return self.result
+
+    async def wait(self):
+        """Ожидает завершения задачи, не отменяя ее при отмене ожидающего"""
+        return await asyncio.shield(self.task)
+
+def _trim_finished():
+    finished = [job_id for job_id, job in _jobs.items() if job.finished]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+async def submit_job(key, func, on_update=None, **kwargs):
+    """Ставит задачу в очередь или присоединяется к уже выполняющейся с тем же ключом
+
+    Args:
+        key: ключ идентичности задачи, например ('upload', True)
+        func (callable): синхронная функция, принимающая progress и kwargs
+        on_update (callable): async-подписчик, получающий задачу при изменениях
+
+    Returns:
+        tuple: (задача, True если запрос присоединен к уже идущей задаче)
+    """
+    job = _active.get(key)
+    attached = job is not None
+
+    if not attached:
+        _trim_finished()
+        job = SyncJob(key, func, kwargs)
+        job._loop = asyncio.get_running_loop()
+        _active[key] = job
+        _jobs[job.id] = job
+        job.task = job._loop.create_task(job._run())
+        logger.info(f"Задача #{job.id} {key} поставлена в очередь")
+    else:
+        logger.info(f"Запрос присоединен к выполняющейся задаче #{job.id} {key}")
+
+    if on_update is not None:
+        job.subscribers.append(on_update)
+        if attached:
+            job._loop.call_soon(job._schedule_notify)
+
+    return job, attached
+
+def get_job(job_id: int):
+    """Возвращает задачу по ID или None"""
+    return _jobs.get(job_id)
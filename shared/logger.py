@@ -1,21 +1,63 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
-from shared.config import LOG_FILE_PATH, LOG_LEVEL, LOGS_DIR
+from datetime import datetime
+from shared.config import LOG_FILE_PATH, LOG_LEVEL, LOGS_DIR, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT
 
 os.makedirs(os.path.dirname(LOG_FILE_PATH), exist_ok=True)
 
+class JsonLinesFormatter(logging.Formatter):
+    """Компактный формат JSON Lines: одна запись — одна строка"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+def make_formatter() -> logging.Formatter:
+    if LOG_FORMAT == 'json':
+        return JsonLinesFormatter()
+    return logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
 logger = logging.getLogger('barhub')
 logger.setLevel(getattr(logging, LOG_LEVEL, 'INFO'))
 
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+formatter = make_formatter()
 
-file_handler = logging.FileHandler(LOG_FILE_PATH, encoding='utf-8')
+# Запись в файл и консоль выполняет отдельный поток QueueListener: вызов логгера
+# в обработчиках бота и в загрузчике только кладет запись в очередь
+file_handler = logging.handlers.RotatingFileHandler(
+    LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+)
 file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
 
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+
+log_queue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+logger.addHandler(queue_handler)
+
+listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+listener.start()
 
 logger.propagate = False
+
+def stop_logging():
+    """Дописывает накопившиеся записи и останавливает поток логирования"""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+atexit.register(stop_logging)
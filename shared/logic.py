@@ -15,7 +15,7 @@ def refresh_and_get_shifts():
 def get_shift_for_user(username):
     try:
         shift = get_user_shift(username)
-        logger.debug(f"Смена для пользователя {username}: {shift}")
+        logger.debug("Смена для пользователя %s: %s", username, shift)
         return shift
     except Exception as e:
         logger.error(f"Ошибка при получении смены пользователя {username}: {e}")
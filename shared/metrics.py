@@ -0,0 +1,199 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from shared.config import METRICS_PORT, METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL
+from shared.fileio import atomic_write_text
+
+logger = logging.getLogger('barhub')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}'
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Histogram:
+    """Гистограмма длительностей (секунды) с метками"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, value in zip(self.buckets, counts):
+                    result.append((f'{self.name}_bucket', key + (('le', repr(float(bound))),), value))
+                result.append((f'{self.name}_bucket', key + (('le', '+Inf'),), count))
+                result.append((f'{self.name}_sum', key, total))
+                result.append((f'{self.name}_count', key, count))
+        return result
+
+class Registry:
+    """Реестр метрик процесса с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str = '') -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str = '', buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+# Метрики синхронизации и бота
+SHEET_STAGE_SECONDS = registry.histogram('barhub_sheet_stage_seconds', 'Длительность этапов чтения таблицы')
+SHEET_ROWS = registry.counter('barhub_sheet_rows_total', 'Прочитано строк листа')
+GOOGLE_API_SECONDS = registry.histogram('barhub_google_api_request_seconds', 'Длительность запросов к Google API')
+GOOGLE_API_ERRORS = registry.counter('barhub_google_api_errors_total', 'Ошибки запросов к Google API по классу')
+UPLOAD_RUNS = registry.counter('barhub_upload_runs_total', 'Запуски upload_shifts по результату')
+UPLOAD_SHIFTS = registry.counter('barhub_upload_shifts_total', 'Смены по действию в upload_shifts')
+UPLOAD_SECONDS = registry.histogram('barhub_upload_seconds', 'Длительность upload_shifts',
+                                    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+HANDLER_SECONDS = registry.histogram('barhub_handler_seconds', 'Длительность обработчиков бота')
+HANDLER_ERRORS = registry.counter('barhub_handler_errors_total', 'Исключения в обработчиках бота')
+
+def error_class(error: Exception) -> str:
+    """Класс ошибки для метрик: HTTP-статус или имя исключения"""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return f'http_{status}' if status else type(error).__name__
+
+def timed_handler(handler):
+    """Оборачивает обработчик бота замером длительности и счетчиком ошибок"""
+    name = handler.__name__
+
+    @wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception as e:
+            HANDLER_ERRORS.inc(handler=name, error=type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = '127.0.0.1'):
+    """Запускает локальный HTTP-endpoint /metrics в фоновом потоке (port=0 — выключен)"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name='barhub-metrics', daemon=True).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
+
+def dump_metrics(path: str = METRICS_DUMP_PATH) -> None:
+    """Записывает метрики в файл (формат Prometheus textfile)"""
+    atomic_write_text(path, registry.render())
+
+def start_metrics_dump(path: str = METRICS_DUMP_PATH, interval: float = METRICS_DUMP_INTERVAL):
+    """Периодически сбрасывает метрики в файл из фонового потока (пустой путь — выключено)"""
+    if not path:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_metrics(path)
+            except Exception as e:
+                logger.error(f"Ошибка при записи метрик в {path}: {e}")
+
+    thread = threading.Thread(target=loop, name='barhub-metrics-dump', daemon=True)
+    thread.start()
+    logger.info(f"Метрики записываются в {path} каждые {interval:.0f} с")
+    return thread
@@ -0,0 +1,76 @@
+import time
+import logging
+import threading
+from shared.config import CALENDAR_QPS, CALENDAR_BURST, CALENDAR_MAX_CONCURRENCY
+
+logger = logging.getLogger('barhub')
+
+class TokenBucket:
+    """Потокобезопасный ограничитель частоты запросов (token bucket)
+
+    Ведро пополняется со скоростью rate токенов в секунду до capacity;
+    acquire блокирует вызывающий поток, пока токенов не хватит.
+    """
+
+    def __init__(self, rate: float, capacity: float, name: str = ''):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.name = name
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Забирает токены, при необходимости ожидая пополнения
+
+        Returns:
+            float: сколько секунд пришлось ждать
+        """
+        if self.rate <= 0:
+            return 0.0
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+        if waited:
+            logger.debug("Лимит запросов %s: ожидание %.2f с", self.name, waited)
+        return waited
+
+    def penalize(self, seconds: float) -> None:
+        """Уводит ведро в минус на seconds секунд пополнения (после отказа по квоте)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - max(0.0, seconds) * self.rate
+        logger.debug("Лимит запросов %s: пауза %.1f с после превышения квоты", self.name, seconds)
+
+_lock = threading.Lock()
+_buckets = {}
+_slots = {}
+
+def get_calendar_limiter(calendar_id: str) -> TokenBucket:
+    """Возвращает ограничитель частоты запросов к календарю (свой на каждый календарь)"""
+    with _lock:
+        bucket = _buckets.get(calendar_id)
+        if bucket is None:
+            bucket = _buckets[calendar_id] = TokenBucket(CALENDAR_QPS, CALENDAR_BURST, name=calendar_id)
+        return bucket
+
+def get_calendar_slot(calendar_id: str) -> threading.BoundedSemaphore:
+    """Возвращает семафор, ограничивающий число одновременных синхронизаций календаря"""
+    with _lock:
+        slot = _slots.get(calendar_id)
+        if slot is None:
+            slot = _slots[calendar_id] = threading.BoundedSemaphore(CALENDAR_MAX_CONCURRENCY)
+        return slot
@@ -0,0 +1,320 @@
+import time
+import logging
+from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+from shared.config import CALENDAR_ID, TIMEZONE, CALENDAR_DELETE_STALE
+from shared.calendar_api import (
+    parse_shift_times,
+    build_shift_event,
+    event_needs_update,
+    format_datetime_for_google,
+    is_next_week_shift,
+    make_shift_event_id,
+    conditional_update_event,
+    load_event_state,
+    save_event_state,
+    remember_event
+)
+from shared.calendar_batch import execute_batched
+from shared.rate_limit import get_calendar_limiter
+from shared.google_requests import execute
+
+logger = logging.getLogger('barhub')
+
+SHIFT_SUMMARY_PREFIX = "Смена: "
+
+def week_start(dt: datetime) -> datetime:
+    """Возвращает полночь понедельника недели, в которую попадает dt"""
+    monday = dt - timedelta(days=dt.weekday())
+    return monday.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def next_week_window():
+    """Возвращает границы следующей недели [понедельник, понедельник+7)"""
+    start = week_start(datetime.now()) + timedelta(weeks=1)
+    return start, start + timedelta(weeks=1)
+
+def fetch_window_events(service, time_min: datetime, time_max: datetime, calendar_id: str = CALENDAR_ID) -> list:
+    """Загружает все события окна одним постраничным запросом list"""
+    events = []
+    page_token = None
+    pages = 0
+
+    limiters = (get_calendar_limiter(calendar_id),)
+    while True:
+        result = execute(service.events().list(
+            calendarId=calendar_id,
+            timeMin=format_datetime_for_google(time_min),
+            timeMax=format_datetime_for_google(time_max),
+            singleEvents=True,
+            showDeleted=False,
+            maxResults=2500,
+            timeZone=TIMEZONE,
+            pageToken=page_token,
+            fields='nextPageToken,items(id,etag,summary,description,start,end,status)'
+        ), limiters=limiters)
+        pages += 1
+        events.extend(result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
+
+    logger.debug("Загружено %s событий окна %s - %s за %s стр.", len(events), time_min.date(), time_max.date(), pages)
+    return events
+
+def event_date(event: dict) -> str:
+    """Возвращает дату начала события в формате YYYY-MM-DD"""
+    start = event.get('start') or {}
+    return (start.get('dateTime') or start.get('date') or '')[:10]
+
+def invalid_shift_key(shift: dict):
+    """Ключ (название, дата) событий смены с ошибкой разбора; дата None, если ее не удалось прочитать"""
+    day = str(shift.get('start_time') or '')[:10]
+    try:
+        datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        day = None
+    return f"{SHIFT_SUMMARY_PREFIX}{shift.get('employee_name')}", day
+
+def index_events(events: list):
+    """Индексирует события смен по ID и по (название, дата)
+
+    Индекс по названию и дате нужен для событий, созданных до перехода на
+    детерминированные ID (make_shift_event_id): у них случайный ID.
+
+    Returns:
+        tuple: (событие по ID, список событий по (название, дата))
+    """
+    by_id = {}
+    by_summary = {}
+    for event in events:
+        summary = event.get('summary') or ''
+        if not summary.startswith(SHIFT_SUMMARY_PREFIX):
+            continue
+        by_id[event['id']] = event
+        by_summary.setdefault((summary, event_date(event)), []).append(event)
+    return by_id, by_summary
+
+def plan_window(shift_dates: list, force: bool):
+    """Определяет окно сверки: следующая неделя или все недели со сменами в ручном режиме"""
+    if not force or not shift_dates:
+        return next_week_window()
+    return week_start(min(shift_dates)), week_start(max(shift_dates)) + timedelta(weeks=1)
+
+def build_sync_plan(service, shifts: list, force: bool = False, calendar_id: str = CALENDAR_ID,
+                    window: tuple = None) -> dict:
+    """Строит полный план синхронизации до любой записи в календарь
+
+    Все события окна загружаются одним постраничным list вместо поиска по
+    каждой смене. План содержит списки create/update/noop/delete/skipped/invalid.
+    Смены сопоставляются с событиями по детерминированному ID (сотрудник,
+    заведение, дата), как и в прямом режиме; смена с уже занятым ID
+    попадает в invalid, а не теряется. События смен из invalid не удаляются:
+    ошибка в строке таблицы не должна стирать смену из календаря.
+
+    Args:
+        window (tuple): явное окно сверки (datetime, datetime); по умолчанию
+            следующая неделя или все недели со сменами в ручном режиме
+    """
+    started = time.perf_counter()
+    plan = {
+        'calendar_id': calendar_id,
+        'create': [], 'update': [], 'noop': [], 'delete': [], 'skipped': [], 'invalid': []
+    }
+
+    desired = {}
+    protected = set()
+    for shift in shifts:
+        try:
+            start_dt, end_dt = parse_shift_times(shift)
+        except Exception as e:
+            logger.error(f"Некорректное время смены {shift.get('employee_name')}: {e}")
+            plan['invalid'].append({'shift': shift, 'error': str(e)})
+            protected.add(invalid_shift_key(shift))
+            continue
+
+        if not force and not is_next_week_shift(start_dt):
+            plan['skipped'].append({'shift': shift})
+            continue
+
+        event_id = make_shift_event_id(shift, start_dt)
+        if event_id in desired:
+            error = (f"повторная смена {shift.get('employee_name')} ({shift.get('shift_name', '')}) "
+                     f"на {start_dt.date()}, в календаре будет только первая")
+            logger.warning(f"Смена пропущена: {error}")
+            plan['invalid'].append({'shift': shift, 'error': error})
+            continue
+        desired[event_id] = {
+            'shift': shift, 'start_dt': start_dt, 'event': build_shift_event(shift, start_dt, end_dt),
+            'event_id': event_id
+        }
+
+    time_min, time_max = window or plan_window([entry['start_dt'] for entry in desired.values()], force)
+    plan['window'] = (time_min, time_max)
+
+    by_id, by_summary = index_events(fetch_window_events(service, time_min, time_max, calendar_id))
+
+    matched = set()
+    for event_id, entry in desired.items():
+        current = by_id.get(event_id)
+        if current is None:
+            # событие со случайным ID из прежних версий: совпадение по названию и дате
+            key = (entry['event']['summary'], entry['start_dt'].strftime('%Y-%m-%d'))
+            current = next((event for event in by_summary.get(key, ())
+                            if event['id'] not in matched and event['id'] not in desired), None)
+        if current is None:
+            plan['create'].append(entry)
+            continue
+
+        matched.add(current['id'])
+        entry['event_id'] = current['id']
+        if event_needs_update(current, entry['event']):
+            entry['etag'] = current.get('etag')
+            plan['update'].append(entry)
+        else:
+            plan['noop'].append(entry)
+
+    def is_protected(event):
+        summary = event.get('summary')
+        return (summary, event_date(event)) in protected or (summary, None) in protected
+
+    stale = [event for event_id, event in by_id.items() if event_id not in matched]
+    kept = [event for event in stale if is_protected(event)]
+    if kept:
+        logger.warning(f"Не удаляются {len(kept)} событий смен с ошибкой разбора")
+        stale = [event for event in stale if not is_protected(event)]
+    plan['delete'] = [{'event': event, 'event_id': event['id']} for event in stale]
+
+    plan['duration'] = time.perf_counter() - started
+    return plan
+
+def log_plan(plan: dict):
+    """Пишет в лог сводку плана синхронизации"""
+    time_min, time_max = plan['window']
+    logger.info(
+        f"План синхронизации {time_min.date()} - {time_max.date()}: "
+        f"создать {len(plan['create'])}, обновить {len(plan['update'])}, "
+        f"без изменений {len(plan['noop'])}, удалить {len(plan['delete'])}, "
+        f"пропущено {len(plan['skipped'])}, ошибок разбора {len(plan['invalid'])} "
+        f"(построен за {plan['duration']:.2f} с)"
+    )
+    for entry in plan['create']:
+        logger.debug("План: создать '%s' на %s", entry['event']['summary'], entry['start_dt'])
+    for entry in plan['update']:
+        logger.debug("План: обновить %s '%s' на %s", entry['event_id'], entry['event']['summary'], entry['start_dt'])
+    for entry in plan['delete']:
+        logger.debug("План: удалить %s '%s' на %s", entry['event_id'], entry['event'].get('summary'), event_date(entry['event']))
+
+def _report_item(report: dict, entry: dict, action: str, error=None):
+    shift = entry.get('shift') or {}
+    report['items'].append({
+        'employee_name': shift.get('employee_name') or entry.get('event', {}).get('summary'),
+        'start_time': shift.get('start_time') or event_date(entry.get('event', {})),
+        'action': action,
+        'status': 'error' if error else 'ok',
+        'error': str(error) if error else None
+    })
+    if error:
+        report['failed'] += 1
+    else:
+        report[action] += 1
+
+def _write_request(service, calendar_id: str, action: str, entry: dict):
+    events = service.events()
+    if action == 'created':
+        return events.insert(calendarId=calendar_id, body={**entry['event'], 'id': entry['event_id']})
+    if action == 'updated':
+        request = events.update(calendarId=calendar_id, eventId=entry['event_id'], body=entry['event'])
+        if entry.get('etag'):
+            # событие изменили после построения плана — Google ответит 412
+            request.headers['If-Match'] = entry['etag']
+        return request
+    return events.delete(calendarId=calendar_id, eventId=entry['event_id'])
+
+def apply_sync_plan(service, plan: dict, batch: bool = True, progress=None) -> dict:
+    """Выполняет запись по плану синхронизации
+
+    Args:
+        batch (bool): Если True, отправляет запись batch-запросами, иначе по одному
+        progress (callable): progress(stage, done, total) для отчета о ходе записи
+
+    Returns:
+        dict: счетчики created/updated/deleted/unchanged/skipped/failed и список items
+    """
+    calendar_id = plan['calendar_id']
+    report = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0, 'items': []}
+
+    for entry in plan['noop']:
+        _report_item(report, entry, 'unchanged')
+    for entry in plan['skipped']:
+        _report_item(report, entry, 'skipped')
+    for entry in plan['invalid']:
+        _report_item(report, entry, 'parse', entry['error'])
+
+    writes = {}
+    for action, entries in (('created', plan['create']), ('updated', plan['update']), ('deleted', plan['delete'])):
+        if action == 'deleted' and not CALENDAR_DELETE_STALE:
+            if entries:
+                logger.info(f"Удаление {len(entries)} устаревших событий отключено (CALENDAR_DELETE_STALE)")
+            continue
+        for index, entry in enumerate(entries):
+            writes[f"{action}:{index}"] = (action, entry)
+
+    on_chunk = (lambda done, total: progress('write', done, total)) if progress else None
+    if progress:
+        progress('write', 0, len(writes))
+
+    if batch:
+        results = execute_batched(
+            service, writes,
+            lambda item: _write_request(service, calendar_id, item[0], item[1]),
+            on_chunk=on_chunk,
+            limiter=get_calendar_limiter(calendar_id)
+        )
+    else:
+        results = {}
+        for key, (action, entry) in writes.items():
+            try:
+                response = execute(_write_request(service, calendar_id, action, entry),
+                                   limiters=(get_calendar_limiter(calendar_id),))
+                results[key] = {'response': response, 'error': None}
+            except Exception as e:
+                results[key] = {'response': None, 'error': e}
+            if on_chunk:
+                on_chunk(len(results), len(writes))
+
+    state = load_event_state()
+    removed = []
+    for key, result in results.items():
+        action, entry = writes[key]
+        response, error = result['response'], result['error']
+
+        conflict = isinstance(error, HttpError) and (
+            action == 'created' and error.resp.status == 409 or action == 'updated' and error.resp.status == 412
+        )
+        if conflict:
+            # 409: ID занят (например, отмененным событием); 412: событие изменили после
+            # построения плана. Событие перечитывается и сверяется заново, запись — по свежему ETag
+            logger.info(f"Конфликт записи {entry['event_id']} (HTTP {error.resp.status}), сверяю заново")
+            try:
+                response, action = conditional_update_event(
+                    service, entry['event_id'], entry['event'], calendar_id=calendar_id
+                )
+                error = None
+            except Exception as e:
+                error = e
+
+        if error is not None:
+            logger.error(f"Ошибка при выполнении '{action}' для {entry['event'].get('summary')}: {error}")
+        elif action in ('created', 'updated'):
+            remember_event(state, entry['event_id'], entry['event'], response or {}, calendar_id)
+        elif action == 'deleted':
+            removed.append(entry['event_id'])
+        _report_item(report, entry, action, error)
+    save_event_state(state, removed=removed)
+
+    logger.info(
+        f"Синхронизация календаря завершена: создано {report['created']}, обновлено {report['updated']}, "
+        f"удалено {report['deleted']}, без изменений {report['unchanged']}, "
+        f"пропущено {report['skipped']}, ошибок {report['failed']}"
+    )
+    return report
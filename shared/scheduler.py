@@ -0,0 +1,169 @@
+import json
+import random
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from shared.config import (
+    SCHEDULER_STATE_PATH,
+    SCHEDULER_JITTER,
+    SCHEDULER_CATCH_UP,
+    POLL_MIN_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_BACKOFF
+)
+from shared.fileio import atomic_write_json
+
+logger = logging.getLogger('barhub')
+
+# Дольше не спим: пробуждение раз в минуту переживает сон машины и перевод часов
+MAX_SLEEP = 60
+
+def load_scheduler_state(path: str = SCHEDULER_STATE_PATH) -> dict:
+    """Загружает время последних запусков задач: имя -> ISO-время"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать состояние планировщика {path}: {e}")
+        return {}
+
+class CronJob:
+    """Еженедельная задача (день недели и время) с догоняющим запуском
+
+    Если после перезапуска выясняется, что последнее плановое время прошло, а
+    задача после него не выполнялась, она запускается сразу — при условии, что
+    пропуск случился не раньше чем catch_up секунд назад.
+    """
+
+    def __init__(self, name: str, func, weekday: int, hour: int, minute: int = 0,
+                 jitter: float = SCHEDULER_JITTER, catch_up: float = SCHEDULER_CATCH_UP):
+        self.name = name
+        self.func = func
+        self.weekday = weekday
+        self.hour = hour
+        self.minute = minute
+        self.jitter = jitter
+        self.catch_up = catch_up
+
+    def previous_occurrence(self, now: datetime) -> datetime:
+        moment = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        moment -= timedelta(days=(moment.weekday() - self.weekday) % 7)
+        if moment > now:
+            moment -= timedelta(weeks=1)
+        return moment
+
+    def first_run(self, now: datetime, last_run: datetime = None) -> datetime:
+        missed = self.previous_occurrence(now)
+        if (last_run is None or last_run < missed) and (now - missed).total_seconds() <= self.catch_up:
+            logger.info(f"Планировщик: задача {self.name} пропустила запуск {missed:%d.%m %H:%M}, выполняю сейчас")
+            return now
+        return self.next_run(now)
+
+    def next_run(self, now: datetime, result=None) -> datetime:
+        moment = self.previous_occurrence(now) + timedelta(weeks=1)
+        return moment + timedelta(seconds=random.uniform(0, self.jitter))
+
+class AdaptiveJob:
+    """Периодическая задача с адаптивным интервалом
+
+    Интервал растет в backoff раз, пока задача сообщает, что ничего не
+    изменилось ({'status': 'unchanged'}) или завершается ошибкой, и
+    сбрасывается до минимального после изменений. В «горячих» окнах
+    (hot_window(now) == True, например перед публикацией графика) интервал
+    всегда минимальный.
+    """
+
+    def __init__(self, name: str, func, min_interval: float = POLL_MIN_INTERVAL,
+                 max_interval: float = POLL_MAX_INTERVAL, backoff: float = POLL_BACKOFF,
+                 hot_window=None, jitter: float = 0.1):
+        self.name = name
+        self.func = func
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.hot_window = hot_window
+        self.jitter = jitter
+        self.interval = min_interval
+
+    def first_run(self, now: datetime, last_run: datetime = None) -> datetime:
+        return now
+
+    def next_run(self, now: datetime, result=None) -> datetime:
+        idle = result is None or isinstance(result, Exception) or (
+            isinstance(result, dict) and result.get('status') == 'unchanged'
+        )
+        self.interval = min(self.interval * self.backoff, self.max_interval) if idle else self.min_interval
+        interval = self.interval
+        if self.hot_window is not None and self.hot_window(now):
+            interval = self.min_interval
+        interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        logger.debug("Планировщик: %s — следующая проверка через %.0f с", self.name, interval)
+        return now + timedelta(seconds=interval)
+
+class Scheduler:
+    """Планировщик задач в цикле событий asyncio
+
+    Каждая задача выполняется в своей корутине; задачи — async-функции без
+    аргументов. Время последнего запуска сохраняется в SCHEDULER_STATE_PATH
+    для догоняющих запусков после перезапуска.
+    """
+
+    def __init__(self, state_path: str = SCHEDULER_STATE_PATH):
+        self.state_path = state_path
+        self.jobs = []
+        self._state = load_scheduler_state(state_path)
+
+    def add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def cron(self, name: str, func, weekday: int, hour: int, minute: int = 0, **kwargs) -> CronJob:
+        return self.add(CronJob(name, func, weekday, hour, minute, **kwargs))
+
+    def adaptive(self, name: str, func, **kwargs) -> AdaptiveJob:
+        return self.add(AdaptiveJob(name, func, **kwargs))
+
+    def _last_run(self, name: str):
+        value = self._state.get(name)
+        try:
+            return datetime.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    def _remember_run(self, name: str, moment: datetime) -> None:
+        self._state[name] = moment.isoformat(timespec='seconds')
+        try:
+            atomic_write_json(self.state_path, self._state, indent=2)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении состояния планировщика: {e}")
+
+    async def _sleep_until(self, moment: datetime) -> None:
+        while True:
+            delay = (moment - datetime.now()).total_seconds()
+            if delay <= 0:
+                return
+            await asyncio.sleep(min(delay, MAX_SLEEP))
+
+    async def _run_job(self, job) -> None:
+        run_at = job.first_run(datetime.now(), self._last_run(job.name))
+        logger.info(f"Планировщик: задача {job.name}, первый запуск {run_at:%d.%m %H:%M:%S}")
+        while True:
+            await self._sleep_until(run_at)
+            started = datetime.now()
+            try:
+                result = await job.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Планировщик: ошибка в задаче {job.name}: {e}")
+                result = e
+            self._remember_run(job.name, started)
+            run_at = job.next_run(datetime.now(), result)
+
+    async def run(self) -> None:
+        """Запускает все задачи и работает до отмены"""
+        logger.info(f"Планировщик запущен, задач: {len(self.jobs)}")
+        await asyncio.gather(*(self._run_job(job) for job in self.jobs))
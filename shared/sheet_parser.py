@@ -1,10 +1,18 @@
 import gspread
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, date
 import logging
 import json
 import os
 import re
-from shared.config import SPREADSHEET_URL, GOOGLE_CREDS_PATH, SHIFTS_DB_PATH
+import hashlib
+from shared.config import SYNC_STATE_PATH, BACKFILL_WORKERS
+from shared.google_clients import get_sheets_session, invalidate_sheets_session, refresh_worksheets
+from shared.fileio import atomic_write_json
+from shared.google_requests import call
+from shared.metrics import SHEET_STAGE_SECONDS, SHEET_ROWS
+from shared.shift_repository import notify_shifts_changed
+from shared.storage import get_storage, flatten_shifts
 
 logger = logging.getLogger('barhub')
 
@@ -19,37 +27,58 @@ def get_current_week_range():
         'end': sunday
     }
 
-def is_current_week(header_text, worksheet):
-    """Проверяет, соответствует ли заголовок текущей неделе"""
-    current_week = get_current_week_range()
-    
-    def extract_numbers(text):
-        if not text:
-            return None
-        parts = text.strip().split('-')
-        if len(parts) == 2 and all(p.isdigit() for p in parts):
-            return [int(p) for p in parts]
-        return None
-    
-    numbers = extract_numbers(header_text)
-    if numbers:
-        if f"{numbers[0]}-{numbers[1]}" == current_week['range']:
-            return True
-            
+HEADER_RANGE = 'C2:I2'
+# Открытый снизу диапазон: API возвращает строки только до последней заполненной,
+# а не всю сетку листа; используются только колонки имени, начала, конца и описания
+DATA_RANGE = 'A2:D'
+DATA_WIDTH = 4
+
+def title_matches_current_week(header_text):
+    """Проверяет, что название листа вида 'd-d' совпадает с текущей неделей"""
+    if not header_text:
+        return False
+    parts = header_text.strip().split('-')
+    if len(parts) == 2 and all(p.isdigit() for p in parts):
+        return f"{int(parts[0])}-{int(parts[1])}" == get_current_week_range()['range']
+    return False
+
+def header_matches_current_week(header_values):
+    """Проверяет, что числа дней в строке C2:I2 совпадают с текущей неделей"""
+    if header_values and header_values[0]:
+        header_numbers = [int(cell) for cell in header_values[0]
+                          if str(cell).strip().isdigit()]
+        if len(header_numbers) >= 2:
+            sheet_week = f"{min(header_numbers)}-{max(header_numbers)}"
+            return sheet_week == get_current_week_range()['range']
+    return False
+
+def is_current_week(header_text, worksheet=None, header_values=None):
+    """Проверяет, соответствует ли заголовок текущей неделе
+
+    Если строка дней header_values уже получена вместе с данными листа,
+    отдельный запрос C2:I2 не выполняется.
+    """
+    if title_matches_current_week(header_text):
+        return True
+
     try:
-        header_values = worksheet.batch_get(['C2:I2'])[0]
-        if header_values and header_values[0]:
-            header_numbers = [int(cell) for cell in header_values[0] 
-                            if str(cell).strip().isdigit()]
-            if len(header_numbers) >= 2:
-                sheet_week = f"{min(header_numbers)}-{max(header_numbers)}"
-                if sheet_week == current_week['range']:
-                    return True
+        if header_values is None and worksheet is not None:
+            header_values = call(worksheet.batch_get, [HEADER_RANGE], description='values.batchGet')[0]
+        return header_matches_current_week(header_values)
     except Exception as e:
-        logger.warning(f"Не удалось проверить диапазон C2:I2: {str(e)}")
+        logger.warning(f"Не удалось проверить диапазон {HEADER_RANGE}: {str(e)}")
     
     return False
 
+def fetch_worksheet_ranges(worksheet):
+    """Получает строку дней и используемые колонки данных одним batch_get
+
+    Returns:
+        tuple: (строка заголовка C2:I2, строки данных начиная со второй)
+    """
+    header_values, values = call(worksheet.batch_get, [HEADER_RANGE, DATA_RANGE], description='values.batchGet')
+    return header_values, [list(row) for row in values]
+
 def extract_shift_name(time_string):
     """Извлекает название бара из строки времени смены, типа '18-2 брудер'"""
     if not time_string:
@@ -57,68 +86,274 @@ def extract_shift_name(time_string):
     match = re.search(r'\b([а-яА-Яa-zA-Z]+)$', time_string.strip())
     return match.group(1).lower() if match else "unknown"
 
-def get_shifts_from_spreadsheet(force=False):
-    """Получает данные о сменах из Google таблицы с группировкой по сотрудникам"""
+def parse_shift_rows(values: list) -> dict:
+    """Группирует строки листа (без строки заголовка) по сотрудникам
+
+    batch_get, в отличие от get_values, не дополняет строки до ширины
+    диапазона: пустые ячейки в конце строки (например, не заполненный конец
+    смены) отсутствуют, поэтому строка дополняется до DATA_WIDTH ячеек.
+    """
+    employee_shifts = {}
+
+    for row_num, row in enumerate(values, start=2):
+        if len(row) < DATA_WIDTH:
+            row = list(row) + [''] * (DATA_WIDTH - len(row))
+        name = row[0].strip()
+        start = row[1].strip()
+        end = row[2].strip()
+        desc = row[3].strip()
+
+        shift_entry = {
+            "start_time": start,
+            "end_time": end,
+            "shift_name": extract_shift_name(start),
+            "description": desc
+        }
+
+        if name:
+            if name not in employee_shifts:
+                employee_shifts[name] = []
+            employee_shifts[name].append(shift_entry)
+        else:
+            logger.warning(f"Пустое имя в строке {row_num}")
+
+    logger.info(f"Группировка завершена: {len(employee_shifts)} сотрудников")
+    return employee_shifts
+
+def content_hash(title: str, values: list) -> str:
+    """Хэш содержимого листа для сравнения с последней успешной синхронизацией"""
+    payload = json.dumps([title, values], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def get_modified_time(spreadsheet):
+    """Возвращает время последнего изменения таблицы из Drive или None"""
+    try:
+        getter = getattr(spreadsheet, 'get_lastUpdateTime', None)
+        return call(getter, description='drive.files.get') if getter else spreadsheet.lastUpdateTime
+    except Exception as e:
+        logger.debug("Не удалось получить время изменения таблицы: %s", e)
+        return None
+
+def load_sync_state() -> dict:
+    """Загружает отпечаток таблицы на момент последней успешной синхронизации"""
+    if not os.path.exists(SYNC_STATE_PATH):
+        return {}
+    try:
+        with open(SYNC_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать {SYNC_STATE_PATH}: {e}")
+        return {}
+
+def mark_sheet_synced(fingerprint: dict) -> None:
+    """Запоминает отпечаток таблицы после успешной загрузки в календарь"""
+    if not fingerprint:
+        return
     try:
-        logger.info("Подключение к Google Sheets...")
-        gc = gspread.service_account(filename=GOOGLE_CREDS_PATH)
-        spreadsheet = gc.open_by_url(SPREADSHEET_URL)
-        worksheets = spreadsheet.worksheets()
-        worksheet = worksheets[-1]
-        current_week = get_current_week_range()
-
-        if not force and is_current_week(worksheet.title, worksheet):
-            logger.info(f"Лист {worksheet.title} — текущая неделя, пропускаем")
-            return {}
-
-        values = worksheet.get_values()
-        if not values:
-            logger.warning("Таблица пуста")
-            return {}
-
-        logger.info(f"Получено {len(values)} строк данных")
-
-        employee_shifts = {}
-
-        for row_num, row in enumerate(values[1:], start=2):
-            if len(row) >= 3:
-                name = row[0].strip()
-                start = row[1].strip()
-                end = row[2].strip()
-                desc = row[3].strip() if len(row) > 3 else ""
-
-                shift_entry = {
-                    "start_time": start,
-                    "end_time": end,
-                    "shift_name": extract_shift_name(start),
-                    "description": desc
-                }
-
-                if name:
-                    if name not in employee_shifts:
-                        employee_shifts[name] = []
-                    employee_shifts[name].append(shift_entry)
-                else:
-                    logger.warning(f"Пустое имя в строке {row_num}")
-
-        logger.info(f"Группировка завершена: {len(employee_shifts)} сотрудников")
-        return employee_shifts
+        atomic_write_json(SYNC_STATE_PATH, {**fingerprint, 'synced_at': datetime.now().isoformat(timespec='seconds')})
+        logger.debug("Отпечаток таблицы сохранен: %s", fingerprint)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении {SYNC_STATE_PATH}: {e}")
+
+def is_not_found(error: Exception) -> bool:
+    """Проверяет, что gspread вернул 404 (таблица или лист удалены)"""
+    if isinstance(error, gspread.exceptions.SpreadsheetNotFound):
+        return True
+    response = getattr(error, 'response', None)
+    return isinstance(error, gspread.exceptions.APIError) and getattr(response, 'status_code', None) == 404
+
+def fetch_sheet_snapshot(force=False, detect_changes=False) -> dict:
+    """Читает последний лист таблицы и определяет, изменился ли он
+
+    При detect_changes сначала сравнивается время изменения таблицы из Drive,
+    и при совпадении данные листа не скачиваются вовсе; иначе сравнивается
+    хэш скачанного содержимого с последней успешной синхронизацией.
 
+    Returns:
+        dict: status ('changed' | 'unchanged' | 'empty'), shifts (по сотрудникам)
+              и fingerprint для mark_sheet_synced
+    """
+    try:
+        try:
+            return _read_snapshot(get_sheets_session(refresh=force), force, detect_changes)
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            logger.warning(f"Таблица или лист не найдены ({e}), переоткрываю сессию Google Sheets")
+            invalidate_sheets_session()
+            return _read_snapshot(get_sheets_session(), force, detect_changes)
     except Exception as e:
         logger.error(f"Ошибка при чтении данных из таблицы: {str(e)}")
         raise
 
-def sync_shifts_to_json(force=False):
-    """Сохраняет сгруппированные смены в локальный JSON-файл"""
+def _read_snapshot(session: dict, force: bool, detect_changes: bool) -> dict:
+    """Читает снимок последнего листа через открытую сессию Google Sheets"""
+    known = load_sync_state() if detect_changes else {}
+
+    with SHEET_STAGE_SECONDS.time(stage='modified_time'):
+        modified_time = get_modified_time(session['spreadsheet']) if detect_changes else None
+    if modified_time and modified_time == known.get('modified_time'):
+        logger.info(f"Таблица не менялась с {modified_time}, пропускаем чтение листа")
+        return {'status': 'unchanged', 'shifts': {}, 'fingerprint': known}
+    if modified_time and session['modified_time'] and modified_time != session['modified_time']:
+        # таблица изменилась — мог появиться лист новой недели
+        refresh_worksheets(session)
+    if modified_time:
+        session['modified_time'] = modified_time
+
+    worksheet = session['worksheets'][-1]
+
+    if not force and title_matches_current_week(worksheet.title):
+        logger.info(f"Лист {worksheet.title} — текущая неделя, пропускаем")
+        return {'status': 'empty', 'shifts': {}, 'fingerprint': None}
+
+    with SHEET_STAGE_SECONDS.time(stage='fetch'):
+        header_values, values = fetch_worksheet_ranges(worksheet)
+    SHEET_ROWS.inc(len(values or []), mode='snapshot')
+    if not force and is_current_week(worksheet.title, header_values=header_values):
+        logger.info(f"Лист {worksheet.title} — текущая неделя, пропускаем")
+        return {'status': 'empty', 'shifts': {}, 'fingerprint': None}
+
+    if not values:
+        logger.warning("Таблица пуста")
+        return {'status': 'empty', 'shifts': {}, 'fingerprint': None}
+
+    logger.info(f"Получено {len(values)} строк данных")
+    fingerprint = {'modified_time': modified_time, 'content_hash': content_hash(worksheet.title, values)}
+
+    if detect_changes and fingerprint['content_hash'] == known.get('content_hash'):
+        logger.info(f"Содержимое листа {worksheet.title} не изменилось, пропускаем разбор")
+        return {'status': 'unchanged', 'shifts': {}, 'fingerprint': fingerprint}
+
+    with SHEET_STAGE_SECONDS.time(stage='parse'):
+        shifts = parse_shift_rows(values)
+    return {'status': 'changed', 'shifts': shifts, 'fingerprint': fingerprint}
+
+def get_shifts_from_spreadsheet(force=False):
+    """Получает данные о сменах из Google таблицы с группировкой по сотрудникам"""
+    return fetch_sheet_snapshot(force=force)['shifts']
+
+def sync_sheet_snapshot(force=False, detect_changes=False) -> dict:
+    """Читает таблицу и сохраняет смены в хранилище, если лист изменился"""
     try:
-        shifts_by_employee = get_shifts_from_spreadsheet(force=force)
-        if shifts_by_employee:
-            with open(SHIFTS_DB_PATH, 'w', encoding='utf-8') as f:
-                json.dump(shifts_by_employee, f, ensure_ascii=False, indent=2)
-            logger.info(f"Смены успешно сохранены в {SHIFTS_DB_PATH}")
-        else:
+        snapshot = fetch_sheet_snapshot(force=force, detect_changes=detect_changes)
+        shifts_by_employee = snapshot['shifts']
+        if snapshot['status'] == 'changed' and shifts_by_employee:
+            storage = get_storage()
+            storage.save_shifts(flatten_shifts(shifts_by_employee))
+            notify_shifts_changed()
+            logger.info(f"Смены успешно сохранены в хранилище {storage.name}")
+        elif snapshot['status'] != 'unchanged':
             logger.info("Нет новых смен для сохранения")
-        return shifts_by_employee
+        return snapshot
     except Exception as e:
         logger.error(f"Ошибка при синхронизации смен: {str(e)}")
         raise
+
+def title_first_day(title):
+    """Возвращает первый день из названия листа вида 'd-d' или None"""
+    parts = (title or '').strip().split('-')
+    if len(parts) == 2 and all(p.isdigit() for p in parts):
+        return int(parts[0])
+    return None
+
+def _align_monday(expected: date, first_day) -> date:
+    """Сдвигает ожидаемый понедельник на ближайший, чье число совпадает с названием листа"""
+    if first_day is None:
+        return expected
+    for delta in (0, -1, 1, -2, 2, -3):
+        candidate = expected + timedelta(weeks=delta)
+        if candidate.day == first_day:
+            return candidate
+    return expected
+
+def resolve_week_worksheets(worksheets: list, start: date, end: date) -> list:
+    """Определяет листы, покрывающие диапазон дат
+
+    Листы идут по неделям подряд, последний — текущая или следующая неделя.
+    Понедельник каждого листа выводится из его позиции и уточняется по
+    первому дню в названии ('5-11').
+
+    Returns:
+        list: пары (лист, понедельник его недели)
+    """
+    current_monday = get_current_week_range()['start'].date()
+    selected = []
+    monday = None
+
+    for worksheet in reversed(worksheets):
+        first_day = title_first_day(worksheet.title)
+        if monday is None:
+            expected = current_monday if title_matches_current_week(worksheet.title) else current_monday + timedelta(weeks=1)
+        else:
+            expected = monday - timedelta(weeks=1)
+        monday = _align_monday(expected, first_day)
+
+        if monday + timedelta(days=6) < start:
+            break
+        if monday <= end:
+            selected.append((worksheet, monday))
+
+    return selected
+
+def _in_range(shift: dict, start: date, end: date) -> bool:
+    try:
+        shift_date = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S').date()
+    except (KeyError, TypeError, ValueError):
+        return False
+    return start <= shift_date <= end
+
+def _fetch_week_shifts(worksheet, start: date, end: date) -> list:
+    with SHEET_STAGE_SECONDS.time(stage='backfill_fetch'):
+        _, values = fetch_worksheet_ranges(worksheet)
+    SHEET_ROWS.inc(len(values or []), mode='backfill')
+    with SHEET_STAGE_SECONDS.time(stage='backfill_parse'):
+        shifts = flatten_shifts(parse_shift_rows(values))
+    return [shift for shift in shifts if _in_range(shift, start, end)]
+
+def iter_backfill_shifts(start: date, end: date, workers: int = BACKFILL_WORKERS):
+    """Параллельно читает листы за диапазон дат и отдает смены по мере готовности
+
+    Yields:
+        dict: week (понедельник), title, shifts (плоский список) и error
+    """
+    session = get_sheets_session(refresh=True)
+    weeks = resolve_week_worksheets(session['worksheets'], start, end)
+    logger.info(f"Backfill {start} - {end}: {len(weeks)} листов, потоков {workers}")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='barhub-backfill') as pool:
+        futures = {
+            pool.submit(_fetch_week_shifts, worksheet, start, end): (worksheet, monday)
+            for worksheet, monday in weeks
+        }
+        for future in as_completed(futures):
+            worksheet, monday = futures[future]
+            try:
+                shifts = future.result()
+                logger.info(f"Backfill: лист {worksheet.title} ({monday}) — {len(shifts)} смен")
+                yield {'week': monday, 'title': worksheet.title, 'shifts': shifts, 'error': None}
+            except Exception as e:
+                logger.error(f"Backfill: ошибка чтения листа {worksheet.title}: {e}")
+                yield {'week': monday, 'title': worksheet.title, 'shifts': [], 'error': str(e)}
+
+def backfill_sheet_shifts(start: date, end: date) -> dict:
+    """Читает смены за диапазон дат и сохраняет их в историю хранилища"""
+    shifts = []
+    for week in iter_backfill_shifts(start, end):
+        shifts.extend(week['shifts'])
+    get_storage().archive_shifts(shifts)
+
+    grouped = {}
+    for shift in shifts:
+        grouped.setdefault(shift['employee_name'], []).append(shift)
+    return grouped
+
+def sync_shifts_to_json(force=False, date_range=None):
+    """Сохраняет смены из таблицы в хранилище (JSON-файл или SQLite)
+
+    Args:
+        date_range (tuple): (date, date) — режим backfill за несколько недель
+    """
+    if date_range:
+        return backfill_sheet_shifts(*date_range)
+    return sync_sheet_snapshot(force=force)['shifts']
@@ -0,0 +1,126 @@
+import logging
+import threading
+from datetime import datetime, date
+from typing import NamedTuple, Optional
+from shared.storage import get_storage
+
+logger = logging.getLogger('barhub')
+
+class Shift(NamedTuple):
+    """Разобранная смена с типизированным временем"""
+    employee_name: str
+    start: datetime
+    end: Optional[datetime]
+    shift_name: str
+    description: str
+    raw: dict
+
+def _parse(shift: dict) -> Optional[Shift]:
+    try:
+        start = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S')
+    except (KeyError, TypeError, ValueError):
+        return None
+    try:
+        end = datetime.strptime(shift['end_time'], '%Y-%m-%d %H:%M:%S')
+    except (KeyError, TypeError, ValueError):
+        end = None
+    return Shift(
+        employee_name=shift.get('employee_name', ''),
+        start=start,
+        end=end,
+        shift_name=shift.get('shift_name', ''),
+        description=shift.get('description', ''),
+        raw=shift
+    )
+
+class ShiftRepository:
+    """Кэш смен в памяти с индексом по дате
+
+    Смены перечитываются из хранилища только при смене его версии (mtime/размер
+    shifts.json или счетчик версии в SQLite) или после явного уведомления
+    notify_changed(); запросы к индексу не читают данные смен.
+    """
+
+    def __init__(self, storage=None):
+        self._storage = storage
+        self._lock = threading.Lock()
+        self._signature = None
+        self._stale = True
+        self._raw = []
+        self._by_date = {}
+        self._last_date = None
+
+    def notify_changed(self):
+        """Помечает кэш устаревшим после записи файла смен"""
+        self._stale = True
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    def _current_signature(self):
+        return self.storage.shifts_version()
+
+    def _ensure_fresh(self):
+        signature = self._current_signature()
+        if not self._stale and signature == self._signature:
+            return
+        with self._lock:
+            signature = self._current_signature()
+            if not self._stale and signature == self._signature:
+                return
+            self._stale = False
+            self._load(signature)
+
+    def _load(self, signature):
+        try:
+            raw = self.storage.load_shifts()
+        except Exception as e:
+            logger.error(f"Непредвиденная ошибка при загрузке смен: {e}")
+            raw = []
+
+        by_date = {}
+        skipped = 0
+        for shift in raw:
+            parsed = _parse(shift)
+            if parsed is None:
+                skipped += 1
+                continue
+            by_date.setdefault(parsed.start.date(), []).append(parsed)
+
+        self._raw = raw
+        self._by_date = by_date
+        self._last_date = max(by_date) if by_date else None
+        self._signature = signature
+        logger.info("Кэш смен обновлен: %s смен (%s), без корректной даты %s", len(raw), self.storage.name, skipped)
+
+    def all(self) -> list:
+        """Возвращает исходные записи смен (list[dict])"""
+        self._ensure_fresh()
+        return list(self._raw)
+
+    def on_date(self, day: date) -> list:
+        """Возвращает смены, начинающиеся в указанный день"""
+        self._ensure_fresh()
+        return list(self._by_date.get(day, ()))
+
+    def has_between(self, start: date, end: date) -> bool:
+        """Проверяет, есть ли смены в диапазоне дат включительно"""
+        self._ensure_fresh()
+        days = (end - start).days + 1
+        if days > len(self._by_date):
+            return any(start <= day <= end for day in self._by_date)
+        return any(date.fromordinal(start.toordinal() + i) in self._by_date for i in range(days))
+
+    def last_date(self) -> Optional[date]:
+        """Возвращает дату самой поздней смены"""
+        self._ensure_fresh()
+        return self._last_date
+
+shift_repository = ShiftRepository()
+
+def notify_shifts_changed():
+    """Сообщает кэшу смен, что смены в хранилище были перезаписаны"""
+    shift_repository.notify_changed()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from shared.executor import get_executor
+
+logger = logging.getLogger('barhub')
+
+class SingleFlight:
+    """Схлопывает пересекающиеся вызовы функции в одно выполнение
+
+    Пока функция выполняется, все новые вызовы объединяются в одно
+    последующее выполнение (не больше одного в очереди) и получают его
+    результат. Аргументы объединяются функцией merge, а колбэки progress
+    всех участников получают прогресс общего выполнения.
+    """
+
+    def __init__(self, func, name: str, merge=None):
+        self.func = func
+        self.name = name
+        self.merge = merge or (lambda current, new: {**current, **new})
+        self._lock = threading.Lock()
+        self._running = None
+        self._running_kwargs = None
+        self._running_progress = []
+        self._pending = None
+        self._pending_kwargs = None
+        self._pending_progress = []
+
+    @property
+    def busy(self) -> bool:
+        return self._running is not None
+
+    def _submit(self, progress, kwargs: dict):
+        """Регистрирует вызов; возвращает (future, нужно ли вызывающему выполнять)"""
+        with self._lock:
+            if self._running is None:
+                self._running = Future()
+                self._running_kwargs = kwargs
+                self._running_progress = [progress] if progress else []
+                return self._running, True
+
+            if self._pending is None:
+                self._pending = Future()
+                self._pending_kwargs = kwargs
+                self._pending_progress = []
+                logger.info(f"{self.name}: выполнение уже идет, запланирован повторный запуск")
+            else:
+                self._pending_kwargs = self.merge(self._pending_kwargs, kwargs)
+                logger.debug("%s: вызов присоединен к запланированному повторному запуску", self.name)
+            if progress:
+                self._pending_progress.append(progress)
+            return self._pending, False
+
+    def _drain(self):
+        """Выполняет текущий запуск; накопившийся повторный запуск уходит в пул потоков"""
+        future, kwargs, callbacks = self._running, self._running_kwargs, self._running_progress
+
+        def progress(stage, done=0, total=0):
+            for callback in list(callbacks):
+                try:
+                    callback(stage, done, total)
+                except Exception as e:
+                    logger.warning(f"{self.name}: ошибка в обработчике прогресса: {e}")
+
+        try:
+            future.set_result(self.func(progress=progress, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+        with self._lock:
+            if self._pending is None:
+                self._running = None
+                return
+            self._running, self._running_kwargs, self._running_progress = (
+                self._pending, self._pending_kwargs, self._pending_progress
+            )
+            self._pending, self._pending_kwargs, self._pending_progress = None, None, []
+        logger.info(f"{self.name}: запуск повторного выполнения для накопившихся вызовов")
+        get_executor().submit(self._drain)
+
+    def run(self, progress=None, **kwargs):
+        """Синхронный вызов: выполняет функцию или ждет результат общего выполнения"""
+        future, leader = self._submit(progress, kwargs)
+        if leader:
+            self._drain()
+        return future.result()
+
+    async def run_async(self, progress=None, **kwargs):
+        """Асинхронный вызов: выполнение идет в пуле потоков, цикл событий не блокируется"""
+        future, leader = self._submit(progress, kwargs)
+        if leader:
+            get_executor().submit(self._drain)
+        return await asyncio.wrap_future(future)
@@ -0,0 +1,360 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from shared.config import (
+    STORAGE_BACKEND,
+    SQLITE_DB_PATH,
+    SHIFTS_DB_PATH,
+    USER_DB_PATH,
+    EMPLOYEES_DB_PATH
+)
+from shared.fileio import atomic_write_json, file_lock
+
+logger = logging.getLogger('barhub')
+
+def flatten_shifts(data) -> list:
+    """Приводит содержимое shifts.json к списку смен
+
+    sync_shifts_to_json раньше писал смены, сгруппированные по сотрудникам
+    ({имя: [смены]}), а save_shifts — плоским списком с employee_name.
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        return [
+            {**shift, 'employee_name': shift.get('employee_name', name)}
+            for name, shifts in data.items()
+            for shift in (shifts or [])
+        ]
+    return []
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка при чтении {path}. Файл поврежден: {e}")
+        return default
+
+def _file_version(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class JsonStorage:
+    """Хранилище в целых JSON-файлах (исходный формат проекта)"""
+
+    name = 'json'
+
+    def __init__(self, shifts_path: str = SHIFTS_DB_PATH, users_path: str = USER_DB_PATH,
+                 employees_path: str = EMPLOYEES_DB_PATH):
+        self.shifts_path = shifts_path
+        self.users_path = users_path
+        self.employees_path = employees_path
+        self._lock = threading.Lock()
+
+    def load_shifts(self) -> list:
+        return flatten_shifts(_read_json(self.shifts_path, []))
+
+    def save_shifts(self, shifts: list) -> None:
+        atomic_write_json(self.shifts_path, shifts, indent=4)
+
+    def shifts_between(self, start: str, end: str) -> list:
+        return [shift for shift in self.load_shifts() if start <= str(shift.get('start_time', ''))[:10] <= end]
+
+    def shifts_version(self):
+        return _file_version(self.shifts_path)
+
+    def archive_shifts(self, shifts: list) -> bool:
+        logger.info(f"Хранилище JSON не ведет историю смен, {len(shifts)} смен backfill не сохранены")
+        return False
+
+    def load_users(self) -> dict:
+        return _read_json(self.users_path, {})
+
+    def apply_user_changes(self, changes: dict) -> None:
+        """Применяет изменения привязок: telegram_id -> сотрудник (None — удалить)
+
+        Чтение и запись выполняются под блокировкой файла, поэтому изменения
+        из нескольких процессов бота не теряют друг друга.
+        """
+        with self._lock, file_lock(self.users_path):
+            users = self.load_users()
+            for telegram_id, employee_name in changes.items():
+                if employee_name is None:
+                    users.pop(telegram_id, None)
+                else:
+                    users[telegram_id] = employee_name
+            atomic_write_json(self.users_path, users, indent=2)
+
+    def users_version(self):
+        return _file_version(self.users_path)
+
+    def load_employees(self) -> list:
+        return _read_json(self.employees_path, {}).get('employees', [])
+
+    def save_employees(self, employees: list) -> None:
+        with file_lock(self.employees_path):
+            atomic_write_json(self.employees_path, {'employees': employees}, indent=4)
+
+    def employees_version(self):
+        return _file_version(self.employees_path)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shifts (
+    id INTEGER PRIMARY KEY,
+    employee_name TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    shift_date TEXT NOT NULL,
+    shift_name TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    sync_id INTEGER NOT NULL,
+    UNIQUE (employee_name, start_time, shift_name)
+);
+CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts (shift_date);
+CREATE INDEX IF NOT EXISTS idx_shifts_employee ON shifts (employee_name, shift_date);
+CREATE INDEX IF NOT EXISTS idx_shifts_venue ON shifts (shift_name, shift_date);
+CREATE INDEX IF NOT EXISTS idx_shifts_sync ON shifts (sync_id);
+
+CREATE TABLE IF NOT EXISTS user_bindings (
+    telegram_id TEXT PRIMARY KEY,
+    employee_name TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS employees (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class SqliteStorage:
+    """Хранилище в SQLite (WAL) с индексированными таблицами
+
+    Таблица shifts хранит историю: save_shifts обновляет только строки
+    диапазона дат новой выгрузки, а load_shifts возвращает последнюю выгрузку.
+    Версии разделов (meta.version:*) увеличиваются в той же транзакции, что и
+    запись, поэтому кэши в других потоках и процессах видят изменения.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = SQLITE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, conn, key: str, default=None):
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _set_meta(self, conn, key: str, value) -> None:
+        conn.execute(
+            'INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, str(value))
+        )
+
+    def _bump_version(self, conn, section: str) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (f"version:{section}",)
+        )
+
+    def _version(self, section: str):
+        return self._meta(self._connect(), f"version:{section}", '0')
+
+    @staticmethod
+    def _shift_row(row) -> dict:
+        return {
+            'employee_name': row['employee_name'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'shift_name': row['shift_name'],
+            'description': row['description']
+        }
+
+    def load_shifts(self) -> list:
+        conn = self._connect()
+        sync_id = int(self._meta(conn, 'current_sync_id', 0))
+        rows = conn.execute(
+            'SELECT * FROM shifts WHERE sync_id = ? ORDER BY shift_date, employee_name', (sync_id,)
+        ).fetchall()
+        return [self._shift_row(row) for row in rows]
+
+    def save_shifts(self, shifts: list) -> None:
+        conn = self._connect()
+        with conn:
+            sync_id = int(self._meta(conn, 'current_sync_id', 0)) + 1
+            dates = []
+            for shift in shifts:
+                start_time = str(shift.get('start_time', ''))
+                shift_date = start_time[:10]
+                dates.append(shift_date)
+                conn.execute(
+                    """
+                    INSERT INTO shifts (employee_name, start_time, end_time, shift_date, shift_name, description, sync_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(employee_name, start_time, shift_name) DO UPDATE SET
+                        end_time = excluded.end_time,
+                        description = excluded.description,
+                        sync_id = excluded.sync_id
+                    """,
+                    (shift.get('employee_name', ''), start_time, shift.get('end_time'), shift_date,
+                     shift.get('shift_name', ''), shift.get('description', ''), sync_id)
+                )
+            if dates:
+                # смены, исчезнувшие из таблицы в пределах выгруженного диапазона
+                conn.execute(
+                    'DELETE FROM shifts WHERE shift_date BETWEEN ? AND ? AND sync_id != ?',
+                    (min(dates), max(dates), sync_id)
+                )
+            self._set_meta(conn, 'current_sync_id', sync_id)
+            self._bump_version(conn, 'shifts')
+
+    def archive_shifts(self, shifts: list) -> bool:
+        """Добавляет смены в историю, не меняя текущую выгрузку (backfill)"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO shifts (employee_name, start_time, end_time, shift_date, shift_name, description, sync_id)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(employee_name, start_time, shift_name) DO UPDATE SET
+                    end_time = excluded.end_time,
+                    description = excluded.description
+                """,
+                [
+                    (shift.get('employee_name', ''), str(shift.get('start_time', '')), shift.get('end_time'),
+                     str(shift.get('start_time', ''))[:10], shift.get('shift_name', ''), shift.get('description', ''))
+                    for shift in shifts
+                ]
+            )
+            self._bump_version(conn, 'shifts')
+        logger.info(f"В историю SQLite добавлено {len(shifts)} смен")
+        return True
+
+    def shifts_between(self, start: str, end: str) -> list:
+        rows = self._connect().execute(
+            'SELECT * FROM shifts WHERE shift_date BETWEEN ? AND ? ORDER BY shift_date, employee_name',
+            (start, end)
+        ).fetchall()
+        return [self._shift_row(row) for row in rows]
+
+    def shifts_version(self):
+        return self._version('shifts')
+
+    def load_users(self) -> dict:
+        rows = self._connect().execute('SELECT telegram_id, employee_name FROM user_bindings').fetchall()
+        return {row['telegram_id']: row['employee_name'] for row in rows}
+
+    def apply_user_changes(self, changes: dict) -> None:
+        """Применяет изменения привязок: telegram_id -> сотрудник (None — удалить)"""
+        conn = self._connect()
+        now = datetime.now().isoformat(timespec='seconds')
+        with conn:
+            for telegram_id, employee_name in changes.items():
+                if employee_name is None:
+                    conn.execute('DELETE FROM user_bindings WHERE telegram_id = ?', (telegram_id,))
+                else:
+                    conn.execute(
+                        """
+                        INSERT INTO user_bindings (telegram_id, employee_name, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT(telegram_id) DO UPDATE SET
+                            employee_name = excluded.employee_name,
+                            updated_at = excluded.updated_at
+                        """,
+                        (telegram_id, employee_name, now)
+                    )
+            self._bump_version(conn, 'users')
+
+    def users_version(self):
+        return self._version('users')
+
+    def load_employees(self) -> list:
+        rows = self._connect().execute('SELECT name FROM employees ORDER BY position').fetchall()
+        return [row['name'] for row in rows]
+
+    def save_employees(self, employees: list) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM employees')
+            conn.executemany(
+                'INSERT OR IGNORE INTO employees (name, position) VALUES (?, ?)',
+                [(name, position) for position, name in enumerate(employees)]
+            )
+            self._bump_version(conn, 'employees')
+
+    def employees_version(self):
+        return self._version('employees')
+
+    def migrate_from_json(self, source: JsonStorage) -> bool:
+        """Однократно переносит данные из JSON-файлов; повторный вызов ничего не делает"""
+        conn = self._connect()
+        if self._meta(conn, 'migrated_from_json'):
+            return False
+
+        shifts = source.load_shifts()
+        users = source.load_users()
+        employees = source.load_employees()
+
+        self.save_shifts(shifts)
+        self.apply_user_changes({str(key): value for key, value in users.items()})
+        self.save_employees(employees)
+        with conn:
+            self._set_meta(conn, 'migrated_from_json', datetime.now().isoformat(timespec='seconds'))
+
+        logger.info(
+            f"Миграция JSON -> SQLite завершена: {len(shifts)} смен, "
+            f"{len(users)} привязок, {len(employees)} сотрудников"
+        )
+        return True
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Возвращает хранилище, выбранное в STORAGE_BACKEND (json | sqlite)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == 'sqlite':
+                    _storage = SqliteStorage()
+                else:
+                    _storage = JsonStorage()
+                logger.info(f"Используется хранилище: {_storage.name}")
+    return _storage
+
+def migrate_json_to_sqlite():
+    """Переносит данные из JSON-файлов в SQLite, если выбран SQLite и миграции еще не было"""
+    storage = get_storage()
+    if isinstance(storage, SqliteStorage):
+        return storage.migrate_from_json(JsonStorage())
+    return False
@@ -1,46 +1,121 @@
 import json
 import os
-from shared.config import USER_DB_PATH, SHIFTS_DB_PATH, EMPLOYEES_DB_PATH
+import atexit
+import threading
+from shared.config import SHIFTS_DB_PATH, USER_DB_FLUSH_DELAY
+from shared.storage import get_storage
 from shared.logger import logger
 
+# Привязки Telegram ID -> сотрудник обслуживаются из памяти и перечитываются, только
+# когда меняется версия хранилища (запись другим процессом бота). Свои изменения по
+# умолчанию записываются сразу: хранилище общее для всех процессов бота, и следующее
+# обновление пользователя может обработать другой процесс. При USER_DB_FLUSH_DELAY > 0
+# (один процесс) изменения копятся и сбрасываются на диск отложенно (write-behind)
+_users = None
+_users_signature = None
+_users_lock = threading.RLock()
+_changes = {}
+_flush_timer = None
+USER_DB_RETRY_DELAY = 1.0
+# Счетчик записей списка сотрудников этим процессом (дополняет версию хранилища)
+_employees_generation = 0
+
 def load_user_db():
     """Загружает базу данных пользователей"""
-    if not os.path.exists(USER_DB_PATH):
-        return {}
     try:
-        with open(USER_DB_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
+        return get_storage().load_users()
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке базы пользователей: {e}")
         return {}
 
-def save_user_db(data):
-    """Сохраняет базу данных пользователей"""
+def save_user_db(changes):
+    """Сохраняет изменения привязок: telegram_id -> сотрудник (None — удалить)"""
     try:
-        os.makedirs(os.path.dirname(USER_DB_PATH), exist_ok=True)
-        with open(USER_DB_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        get_storage().apply_user_changes(changes)
         return True
     except Exception as e:
         logger.error(f"Ошибка при сохранении базы пользователей: {e}")
         return False
 
+def _users_version():
+    try:
+        return get_storage().users_version()
+    except Exception as e:
+        logger.error(f"Ошибка при проверке версии базы пользователей: {e}")
+        return _users_signature
+
+def _get_users():
+    global _users, _users_signature
+    signature = _users_version()
+    if _users is None or signature != _users_signature:
+        with _users_lock:
+            if _users is None or signature != _users_signature:
+                users = load_user_db()
+                # еще не записанные изменения этого процесса поверх прочитанного
+                for telegram_id, employee_name in _changes.items():
+                    if employee_name is None:
+                        users.pop(telegram_id, None)
+                    else:
+                        users[telegram_id] = employee_name
+                _users = users
+                _users_signature = signature
+                logger.debug("Загружено %s привязок пользователей", len(_users))
+    return _users
+
+def _schedule_flush(telegram_id=None, employee_name=None):
+    """Записывает изменение сразу или планирует запись через USER_DB_FLUSH_DELAY секунд
+
+    Без нового изменения (повтор после ошибки записи) запись всегда откладывается.
+    """
+    global _flush_timer
+    if telegram_id is not None:
+        _changes[telegram_id] = employee_name
+        if USER_DB_FLUSH_DELAY <= 0:
+            flush_user_db()
+            return
+    if _flush_timer is None:
+        delay = USER_DB_FLUSH_DELAY if USER_DB_FLUSH_DELAY > 0 else USER_DB_RETRY_DELAY
+        _flush_timer = threading.Timer(delay, flush_user_db)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+def flush_user_db():
+    """Сбрасывает накопленные изменения привязок на диск"""
+    global _changes, _flush_timer
+    with _users_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if not _changes:
+            return True
+        changes, _changes = _changes, {}
+        if save_user_db(changes):
+            return True
+        _changes = {**changes, **_changes}
+        _schedule_flush()
+        return False
+
+atexit.register(flush_user_db)
+
 def get_user_employee(telegram_id):
     """Получает сотрудника, связанного с Telegram ID"""
-    users = load_user_db()
-    return users.get(str(telegram_id))
+    return _get_users().get(str(telegram_id))
 
 def save_user_employee(telegram_id, employee_name):
     """Сохраняет связь между Telegram ID и сотрудником"""
-    users = load_user_db()
-    users[str(telegram_id)] = employee_name
-    return save_user_db(users)
+    _get_users()
+    with _users_lock:
+        _users[str(telegram_id)] = employee_name
+        _schedule_flush(str(telegram_id), employee_name)
+    return True
 
 def remove_user_employee(telegram_id):
     """Удаляет связь между Telegram ID и сотрудником"""
-    users = load_user_db()
-    if str(telegram_id) in users:
-        del users[str(telegram_id)]
-        return save_user_db(users)
+    _get_users()
+    with _users_lock:
+        if str(telegram_id) in _users:
+            del _users[str(telegram_id)]
+            _schedule_flush(str(telegram_id), None)
     return True
 
 def load_shifts():
@@ -61,19 +136,26 @@ def load_shifts():
 def load_employees():
     """Загружает список сотрудников из БД"""
     try:
-        with open(EMPLOYEES_DB_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('employees', [])
+        return get_storage().load_employees()
     except Exception as e:
         logger.error(f"Ошибка при загрузке списка сотрудников: {e}")
         return []
 
 def save_employees(employees_list):
     """Сохраняет список сотрудников в БД"""
+    global _employees_generation
     try:
-        with open(EMPLOYEES_DB_PATH, 'w', encoding='utf-8') as f:
-            json.dump({'employees': employees_list}, f, ensure_ascii=False, indent=4)
+        get_storage().save_employees(employees_list)
+        _employees_generation += 1
         return True
     except Exception as e:
         logger.error(f"Ошибка при сохранении списка сотрудников: {e}")
         return False
+
+def employees_signature():
+    """Версия списка сотрудников для кэшей: версия хранилища и счетчик записей процесса"""
+    try:
+        return get_storage().employees_version(), _employees_generation
+    except Exception as e:
+        logger.error(f"Ошибка при проверке версии списка сотрудников: {e}")
+        return None, _employees_generation
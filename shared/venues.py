@@ -0,0 +1,28 @@
+import logging
+from shared.config import CALENDAR_ID, VENUE_CALENDARS
+
+logger = logging.getLogger('barhub')
+
+def calendar_for_venue(venue: str) -> str:
+    """Возвращает календарь заведения; неизвестные заведения идут в CALENDAR_ID"""
+    return VENUE_CALENDARS.get((venue or '').lower(), CALENDAR_ID)
+
+def routed_calendars() -> list:
+    """Возвращает все календари из таблицы маршрутизации, включая календарь по умолчанию"""
+    return list(dict.fromkeys([CALENDAR_ID, *VENUE_CALENDARS.values()]))
+
+def route_shifts(shifts: list) -> dict:
+    """Раскладывает смены по календарям заведений
+
+    В результат попадают все календари маршрутизации, даже без смен, чтобы
+    сверка удалила из них события смен, перенесенных в другое заведение.
+
+    Returns:
+        dict: calendar_id -> список смен
+    """
+    routed = {calendar_id: [] for calendar_id in routed_calendars()}
+    for shift in shifts:
+        routed.setdefault(calendar_for_venue(shift.get('shift_name')), []).append(shift)
+    if len(routed) > 1:
+        logger.debug("Смены по календарям: " + ", ".join(f"{cid}: {len(items)}" for cid, items in routed.items()))
+    return routed
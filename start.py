@@ -3,11 +3,17 @@ import json
 import asyncio
 from shared.config import (
     TELEGRAM_TOKEN, DATABASE_DIR, DATA_DIR, LOGS_DIR,
-    USER_DB_PATH, SHIFTS_DB_PATH, EMPLOYEES_DB_PATH, LOG_FILE_PATH
+    USER_DB_PATH, SHIFTS_DB_PATH, EMPLOYEES_DB_PATH, LOG_FILE_PATH,
+    BOT_MODE, SCHEDULER_ENABLED
 )
-from shared.logger import logger
-from tg_bot.bot import run_bot
-from calendar_uploader.uploader import run_uploader
+from shared.logger import logger, stop_logging
+from shared.executor import shutdown_executor
+from shared.user_db import flush_user_db
+from shared.storage import migrate_json_to_sqlite
+from shared.metrics import start_metrics_server, start_metrics_dump
+from tg_bot.bot import run_bot, run_webhook
+from shared.scheduler import Scheduler
+from calendar_uploader.uploader import register_upload_jobs
 
 if not TELEGRAM_TOKEN:
     logger.critical("TELEGRAM_TOKEN не найден в .env файле")
@@ -32,20 +38,35 @@ def init_project_structure():
                 json.dump(default_content, f, ensure_ascii=False, indent=2)
             logger.info(f"Создан файл: {file_path}")
 
+    if migrate_json_to_sqlite():
+        logger.info("Данные из JSON-файлов перенесены в SQLite")
+
 async def main():
     """Главная функция приложения"""
     logger.info("Запуск системы Barhub...")
     logger.debug("Инициализация главного цикла...")
     
     init_project_structure()
+    start_metrics_server()
+    start_metrics_dump()
     
     logger.info("Barhub стартует 🚀")
-    logger.debug("Запуск бота и календарного аплоудера...")
+    logger.debug("Запуск бота и планировщика...")
     
-    await asyncio.gather(
-        run_bot(),
-        run_uploader()
-    )
+    if BOT_MODE not in ('polling', 'webhook'):
+        raise ValueError(f"Неизвестный BOT_MODE: {BOT_MODE} (ожидается polling или webhook)")
+    logger.info(f"Режим получения обновлений Telegram: {BOT_MODE}")
+    tasks = [run_webhook() if BOT_MODE == 'webhook' else run_bot()]
+    if SCHEDULER_ENABLED:
+        tasks.append(register_upload_jobs(Scheduler()).run())
+    else:
+        logger.info("Планировщик в этом процессе выключен (SCHEDULER_ENABLED=0)")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        flush_user_db()
+        shutdown_executor(wait=False)
+        stop_logging()
 
 if __name__ == "__main__":
     try:
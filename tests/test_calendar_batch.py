@@ -0,0 +1,67 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault('TELEGRAM_TOKEN', 'test')
+os.environ.setdefault('CALENDAR_ID', 'test@group.calendar.google.com')
+os.environ.setdefault('SPREADSHEET_ID', 'test')
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from shared import calendar_batch
+from shared.google_requests import CircuitBreaker, CircuitOpenError
+
+class _Limiter:
+    def acquire(self, tokens=1):
+        pass
+
+    def penalize(self, delay):
+        pass
+
+class _FailingService:
+    """Календарь, у которого каждый запрос пачки завершается 503"""
+
+    def __init__(self):
+        self.executed = 0
+
+    def new_batch_http_request(self, callback):
+        service = self
+        keys = []
+
+        class Batch:
+            def add(self, request, request_id):
+                keys.append(request_id)
+
+            def execute(self):
+                service.executed += 1
+                for key in keys:
+                    callback(key, None, HttpError(httplib2.Response({'status': 503}), b'backend error'))
+
+        return Batch()
+
+class ExecuteBatchedBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('calendar', threshold=2, reset_timeout=60)
+        patches = [
+            mock.patch.object(calendar_batch, 'get_breaker', return_value=self.breaker),
+            mock.patch.object(calendar_batch, 'get_api_limiter', return_value=_Limiter()),
+            mock.patch.object(calendar_batch.time, 'sleep'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_open_breaker_stops_remaining_chunks(self):
+        service = _FailingService()
+        items = {f"event{i}": i for i in range(calendar_batch.CALENDAR_BATCH_SIZE * 15)}
+
+        results = calendar_batch.execute_batched(service, items, make_request=lambda item: item)
+
+        self.assertEqual(service.executed, self.breaker.threshold)
+        self.assertEqual(self.breaker.state, 'open')
+        # Упавшие пачки при повторе тоже отклоняются открытым предохранителем
+        self.assertTrue(all(isinstance(result['error'], CircuitOpenError) for result in results.values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,49 @@
 import os
+import asyncio
 from dotenv import load_dotenv
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from shared.config import TELEGRAM_TOKEN
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from shared.config import (
+    TELEGRAM_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_CONCURRENCY, WEBHOOK_MAX_CONNECTIONS, WEBHOOK_REUSE_PORT, WEBHOOK_REGISTER
+)
 from shared.logger import logger
+from tg_bot.fsm_storage import make_fsm_storage
 
 load_dotenv()
 
 bot = Bot(token=TELEGRAM_TOKEN)
-dp = Dispatcher()
+dp = Dispatcher(storage=make_fsm_storage())
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Обработчик webhook с ограничением числа одновременно обрабатываемых обновлений
+
+    Telegram получает ответ сразу после постановки обновления в обработку;
+    когда заняты все WEBHOOK_CONCURRENCY слотов, ответ задерживается до
+    освобождения слота, и Telegram сам придерживает следующие обновления.
+    """
+
+    def __init__(self, *args, concurrency: int = WEBHOOK_CONCURRENCY, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def _background_feed_update(self, bot, update):
+        try:
+            await super()._background_feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке обновления из webhook: {e}")
+        finally:
+            self._slots.release()
+
+    async def _handle_request_background(self, bot, request):
+        await self._slots.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except Exception:
+            # Обновление не удалось прочитать — задача не создана, слот освобождаем здесь
+            self._slots.release()
+            raise
 
 async def setup_handlers():
     from tg_bot.handlers.main_menu import register_handlers
@@ -19,14 +54,54 @@ async def run_bot():
     try:
         logger.info("Запуск Telegram-бота...")
         await setup_handlers()
+        # Пока зарегистрирован webhook, getUpdates возвращает ошибку конфликта
+        await bot.delete_webhook()
         await dp.start_polling(bot, skip_updates=True)
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
         raise
 
+async def run_webhook():
+    """Запуск бота в режиме webhook на встроенном aiohttp-сервере"""
+    try:
+        logger.info(f"Запуск Telegram-бота (webhook) на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}...")
+        await setup_handlers()
+
+        app = web.Application()
+        BoundedRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=WEBHOOK_SECRET,
+            concurrency=WEBHOOK_CONCURRENCY
+        ).register(app, path=WEBHOOK_PATH)
+        setup_application(app, dp, bot=bot)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=WEBHOOK_REUSE_PORT or None)
+        await site.start()
+    except Exception as e:
+        logger.error(f"Ошибка при запуске бота: {e}")
+        raise
+
+    try:
+        if WEBHOOK_REGISTER:
+            if not WEBHOOK_URL:
+                raise ValueError("WEBHOOK_URL не задан, зарегистрировать webhook невозможно")
+            await bot.set_webhook(
+                f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"Webhook зарегистрирован: {WEBHOOK_URL}{WEBHOOK_PATH}")
+        logger.info(f"Бот принимает обновления, одновременно обрабатывается до {WEBHOOK_CONCURRENCY}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
 if __name__ == "__main__":
     try:
-        import asyncio
         asyncio.run(run_bot())  # Запуск с asyncio
     except Exception as e:
         logger.exception("Ошибка при запуске бота")
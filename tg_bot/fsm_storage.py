@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Dict, Mapping, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, KeyBuilder, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+from shared.config import FSM_STORAGE, FSM_DB_PATH
+from shared.logger import logger
+
+FSM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+"""
+
+class SqliteFSMStorage(BaseStorage):
+    """Хранилище состояний FSM aiogram в SQLite (WAL)
+
+    Файл базы общий для всех процессов бота: состояние и данные диалога
+    пользователя видны любому процессу, который получит его следующее
+    обновление. update_data выполняет чтение и запись в одной транзакции
+    BEGIN IMMEDIATE, поэтому одновременные обновления из разных процессов
+    не теряют друг друга. Запросы выполняются в пуле потоков asyncio, чтобы
+    ожидание блокировки базы не останавливало цикл событий.
+    """
+
+    def __init__(self, path: str = FSM_DB_PATH, key_builder: Optional[KeyBuilder] = None):
+        self.path = path
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connect().executescript(FSM_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: транзакции открываются явно в _update_data
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key)
+
+    @staticmethod
+    def _cleanup(conn: sqlite3.Connection, record_key: str) -> None:
+        conn.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'", (record_key,))
+
+    def _set_state(self, record_key: str, state: Optional[str]) -> None:
+        conn = self._connect()
+        conn.execute(
+            """
+            INSERT INTO fsm (key, state, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+            """,
+            (record_key, state, time.time())
+        )
+        if state is None:
+            self._cleanup(conn, record_key)
+
+    def _get_row(self, record_key: str):
+        return self._connect().execute('SELECT state, data FROM fsm WHERE key = ?', (record_key,)).fetchone()
+
+    def _write_data(self, conn: sqlite3.Connection, record_key: str, data: dict) -> None:
+        conn.execute(
+            """
+            INSERT INTO fsm (key, data, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+            """,
+            (record_key, json.dumps(data, ensure_ascii=False), time.time())
+        )
+        if not data:
+            self._cleanup(conn, record_key)
+
+    def _set_data(self, record_key: str, data: dict) -> None:
+        self._write_data(self._connect(), record_key, data)
+
+    def _update_data(self, record_key: str, data: dict) -> dict:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data FROM fsm WHERE key = ?', (record_key,)).fetchone()
+            current = json.loads(row[0]) if row else {}
+            current.update(data)
+            self._write_data(conn, record_key, current)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return current
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await asyncio.to_thread(self._set_state, self._key(key), value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await asyncio.to_thread(self._get_row, self._key(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await asyncio.to_thread(self._set_data, self._key(key), dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await asyncio.to_thread(self._get_row, self._key(key))
+        return json.loads(row[1]) if row else {}
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._update_data, self._key(key), dict(data))
+
+    async def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+def make_fsm_storage(backend: str = FSM_STORAGE) -> BaseStorage:
+    """Создает хранилище FSM по FSM_STORAGE (sqlite | memory)"""
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend != 'sqlite':
+        raise ValueError(f"Неизвестный FSM_STORAGE: {backend} (ожидается sqlite или memory)")
+    logger.info(f"Состояния FSM хранятся в SQLite: {FSM_DB_PATH}")
+    return SqliteFSMStorage()
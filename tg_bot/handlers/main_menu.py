@@ -1,11 +1,20 @@
 from aiogram import types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from calendar_uploader.uploader import upload_shifts
-from shared.calendar_api import load_shifts_from_db
+from calendar_uploader.uploader import upload_flight
+from shared.shift_repository import shift_repository
+from shared.jobs import submit_job
 from datetime import datetime, timedelta
 from shared.logger import logger
-from shared.user_db import get_user_employee, save_user_employee, load_employees
+from shared.metrics import timed_handler
+from shared.user_db import get_user_employee, save_user_employee
+from tg_bot.keyboards import employee_keyboards, parse_page_callback, EMPLOYEE_PAGE_PREFIX
+
+SYNC_STAGES = {
+    'fetch': 'получение таблицы смен',
+    'plan': 'сверка с календарем',
+    'write': 'запись событий'
+}
 
 def get_current_week():
     today = datetime.now()
@@ -16,16 +25,8 @@ def should_auto_upload():
     """Проверяет, нужно ли автоматически загружать смены"""
     current_week = get_current_week()
     next_week = current_week + timedelta(weeks=1)
-    shifts = load_shifts_from_db()
-    
-    if not shifts:
-        return False
-    
-    for shift in shifts:
-        shift_date = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S')
-        if shift_date.date() >= next_week.date():
-            return True
-    return False
+    last_date = shift_repository.last_date()
+    return last_date is not None and last_date >= next_week.date()
 
 def get_main_menu(user_name: str) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(inline_keyboard=[ 
@@ -45,14 +46,7 @@ def get_additional_menu() -> InlineKeyboardMarkup:
     return keyboard
 
 def get_employee_selection_menu() -> InlineKeyboardMarkup:
-    employees = load_employees()
-    keyboard = []
-    for employee in employees:
-        keyboard.append([InlineKeyboardButton(
-            text=employee,
-            callback_data=f"select_employee:{employee}"
-        )])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return employee_keyboards.root()
 
 def get_confirmation_menu() -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(inline_keyboard=[ 
@@ -62,23 +56,62 @@ def get_confirmation_menu() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+def format_job_status(job) -> str:
+    """Формирует текст сообщения о ходе фоновой загрузки смен"""
+    title = f"Загрузка смен (задача #{job.id})"
+    if job.status == 'queued':
+        return f"{title}: в очереди"
+    if job.status == 'failed':
+        return f"{title}: ошибка\n{job.error}"
+    if job.status == 'done':
+        report = job.result
+        if isinstance(report, dict) and 'created' in report:
+            return (f"{title}: готово\n"
+                    f"Создано: {report['created']}, обновлено: {report['updated']}, "
+                    f"без изменений: {report['unchanged']}, ошибок: {report['failed']}")
+        if isinstance(report, dict) and report.get('status') == 'unchanged':
+            return f"{title}: готово, таблица не изменилась"
+        return f"{title}: готово, новых смен для загрузки нет"
+    if job.stage == 'write':
+        return f"{title}: записано {job.done} из {job.total} событий"
+    return f"{title}: {SYNC_STAGES.get(job.stage, 'запуск')}..."
+
+def make_job_progress_editor(message: types.Message):
+    """Возвращает подписчика задачи, который редактирует сообщение с прогрессом"""
+    last_text = message.text
+
+    async def on_update(job):
+        nonlocal last_text
+        text = format_job_status(job)
+        if text == last_text:
+            return
+        last_text = text
+        await message.edit_text(text, reply_markup=get_additional_menu())
+
+    return on_update
+
+async def start_upload_job(callback: types.CallbackQuery, force: bool):
+    """Ставит загрузку смен в фоновую очередь и сразу отвечает на callback"""
+    job, attached = await submit_job(
+        ('upload_shifts', force),
+        upload_flight.run,
+        on_update=make_job_progress_editor(callback.message),
+        force=force
+    )
+    if attached:
+        await callback.answer(f"Загрузка уже идет (задача #{job.id}), показываю ее прогресс")
+    else:
+        await callback.answer(f"Загрузка запущена (задача #{job.id})")
+    return job
+
 async def process_on_shift(callback: types.CallbackQuery):
     logger.info(f"Пользователь {callback.from_user.id} запросил информацию о текущих сменах")
     try:
-        shifts = load_shifts_from_db()
-        logger.debug(f"Загружено смен из БД: {len(shifts)}")
-        
-        today = datetime.now()
-        today_shifts = []
-        
-        for shift in shifts:
-            shift_date = datetime.strptime(shift['start_time'], '%Y-%m-%d %H:%M:%S')
-            if shift_date.date() == today.date():
-                today_shifts.append(shift['employee_name'])
-                logger.debug(f"Найдена смена на сегодня: {shift['employee_name']}")
+        today_shifts = [shift.employee_name for shift in shift_repository.on_date(datetime.now().date())]
+        logger.debug("Найдено смен на сегодня: %s", len(today_shifts))
         
         current_user = get_user_employee(callback.from_user.id) or "Не выбран"
-        logger.debug(f"Текущий пользователь: {current_user}")
+        logger.debug("Текущий пользователь: %s", current_user)
         
         if today_shifts:
             message = "Сегодня на смене:\n" + "\n".join(today_shifts)
@@ -125,7 +158,7 @@ async def process_employee_selection(callback: types.CallbackQuery):
     try:
         if callback.data.startswith("select_employee:"):
             employee = callback.data.split(":", 1)[1]
-            logger.debug(f"Выбран сотрудник: {employee}")
+            logger.debug("Выбран сотрудник: %s", employee)
             
             if save_user_employee(callback.from_user.id, employee):
                 logger.info(f"Пользователь {callback.from_user.id} сохранен как {employee}")
@@ -147,14 +180,26 @@ async def process_employee_selection(callback: types.CallbackQuery):
         logger.error(f"Ошибка при выборе сотрудника {callback.from_user.id}: {e}")
         await callback.answer("Произошла ошибка, попробуйте еще раз")
 
+async def process_employee_page(callback: types.CallbackQuery):
+    """Листает алфавит и страницы выбора сотрудника, меняя только клавиатуру"""
+    try:
+        bucket, page = parse_page_callback(callback.data)
+        logger.debug("Пользователь %s открыл раздел '%s', страница %s", callback.from_user.id, bucket, page)
+        keyboard = employee_keyboards.page(bucket, page) if bucket else employee_keyboards.root()
+        if keyboard != callback.message.reply_markup:
+            await callback.message.edit_reply_markup(reply_markup=keyboard)
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Ошибка при листании списка сотрудников {callback.from_user.id}: {e}")
+        await callback.answer("Произошла ошибка, попробуйте еще раз")
+
 async def process_manual_upload(callback: types.CallbackQuery):
     logger.info(f"Запрос ручной загрузки смен от пользователя {callback.from_user.id}")
     try:
-        upload_shifts(force=True)
-        logger.info("Ручная загрузка смен выполнена успешно")
-        await callback.answer("Смены загружены в календарь")
+        job = await start_upload_job(callback, force=True)
+        logger.info(f"Ручная загрузка смен поставлена в очередь как задача #{job.id}")
     except Exception as e:
-        logger.error(f"Ошибка при ручной загрузке смен: {e}")
+        logger.error(f"Ошибка при постановке ручной загрузки смен: {e}")
         await callback.answer("Ошибка при загрузке смен")
 
 async def refresh_shifts(callback: types.CallbackQuery):
@@ -169,12 +214,12 @@ async def process_refresh_confirmation(callback: types.CallbackQuery):
     if callback.data == "confirm_refresh":
         logger.info(f"Подтверждено обновление смен пользователем {callback.from_user.id}")
         try:
-            upload_shifts()
-            logger.info("Обновление таблицы смен выполнено успешно")
-            await callback.answer("Таблица смен обновлена и загружена в календарь")
+            job = await start_upload_job(callback, force=False)
+            logger.info(f"Обновление таблицы смен поставлено в очередь как задача #{job.id}")
         except Exception as e:
             logger.error(f"Ошибка при обновлении таблицы смен: {e}")
             await callback.answer("Ошибка при обновлении таблицы")
+        return
     elif callback.data == "cancel_refresh":
         logger.info(f"Отменено обновление смен пользователем {callback.from_user.id}")
         await callback.answer("Обновление отменено")
@@ -190,7 +235,7 @@ async def process_additional_menu(callback: types.CallbackQuery):
     try:
         current_text = callback.message.text
         current_user = get_user_employee(callback.from_user.id) or "Не выбран"
-        logger.debug(f"Текущий пользователь: {current_user}")
+        logger.debug("Текущий пользователь: %s", current_user)
         
         await callback.message.edit_text(
             f"Дополнительные функции (пользователь: {current_user}):",
@@ -205,7 +250,7 @@ async def process_back_to_main(callback: types.CallbackQuery):
     logger.info(f"Возврат в главное меню от пользователя {callback.from_user.id}")
     try:
         current_user = get_user_employee(callback.from_user.id) or "Не выбран"
-        logger.debug(f"Текущий пользователь: {current_user}")
+        logger.debug("Текущий пользователь: %s", current_user)
         
         await callback.message.edit_text(
             f"Привет, {current_user}!\nЧто ты хочешь сделать?",
@@ -218,13 +263,15 @@ async def process_back_to_main(callback: types.CallbackQuery):
 
 def register_handlers(dp):
     logger.info("Регистрация обработчиков команд главного меню")
-    dp.message.register(cmd_start, Command("start"))
-    dp.callback_query.register(process_employee_selection, lambda c: c.data and c.data.startswith("select_employee:"))
-    dp.callback_query.register(process_on_shift, lambda c: c.data == "on_shift")
-    dp.callback_query.register(process_employee_selection, lambda c: c.data == "change_user")
-    dp.callback_query.register(process_manual_upload, lambda c: c.data == "manual_upload")
-    dp.callback_query.register(refresh_shifts, lambda c: c.data == "refresh_shifts")
-    dp.callback_query.register(process_refresh_confirmation, lambda c: c.data in ["confirm_refresh", "cancel_refresh"])
-    dp.callback_query.register(process_additional_menu, lambda c: c.data == "additional_menu")
-    dp.callback_query.register(process_back_to_main, lambda c: c.data == "back_to_main")
+    # Каждый обработчик обернут замером длительности (barhub_handler_seconds)
+    dp.message.register(timed_handler(cmd_start), Command("start"))
+    dp.callback_query.register(timed_handler(process_employee_selection), lambda c: c.data and c.data.startswith("select_employee:"))
+    dp.callback_query.register(timed_handler(process_on_shift), lambda c: c.data == "on_shift")
+    dp.callback_query.register(timed_handler(process_employee_selection), lambda c: c.data == "change_user")
+    dp.callback_query.register(timed_handler(process_employee_page), lambda c: c.data and c.data.split(":", 1)[0] == EMPLOYEE_PAGE_PREFIX)
+    dp.callback_query.register(timed_handler(process_manual_upload), lambda c: c.data == "manual_upload")
+    dp.callback_query.register(timed_handler(refresh_shifts), lambda c: c.data == "refresh_shifts")
+    dp.callback_query.register(timed_handler(process_refresh_confirmation), lambda c: c.data in ["confirm_refresh", "cancel_refresh"])
+    dp.callback_query.register(timed_handler(process_additional_menu), lambda c: c.data == "additional_menu")
+    dp.callback_query.register(timed_handler(process_back_to_main), lambda c: c.data == "back_to_main")
     logger.info("Все обработчики команд зарегистрированы успешно")
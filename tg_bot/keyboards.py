@@ -0,0 +1,130 @@
+import threading
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from shared.config import EMPLOYEE_PAGE_SIZE
+from shared.logger import logger
+from shared.user_db import load_employees, employees_signature
+
+EMPLOYEE_PAGE_PREFIX = "employees"
+LETTER_COLUMNS = 6
+OTHER_BUCKET = "#"
+
+def sort_key(name: str) -> str:
+    """Ключ сортировки по алфавиту: без учета регистра, Ё рядом с Е"""
+    return name.casefold().replace('ё', 'е')
+
+def bucket_of(name: str) -> str:
+    """Буква алфавитного раздела: первая буква имени, прочие символы — '#'"""
+    for char in sort_key(name.strip()):
+        if char.isalpha():
+            return char.upper()
+        break
+    return OTHER_BUCKET
+
+def page_callback(bucket: str = '', page: int = 0) -> str:
+    if not bucket:
+        return EMPLOYEE_PAGE_PREFIX
+    return f"{EMPLOYEE_PAGE_PREFIX}:{bucket}:{page}"
+
+def parse_page_callback(data: str):
+    """Разбирает callback_data страницы выбора: (буква, страница); ('', 0) — алфавит"""
+    _, _, rest = data.partition(':')
+    bucket, _, page = rest.rpartition(':')
+    if not bucket:
+        return '', 0
+    try:
+        return bucket, max(int(page), 0)
+    except ValueError:
+        return bucket, 0
+
+class EmployeeKeyboards:
+    """Кэш клавиатур выбора сотрудника
+
+    Список сотрудников перечитывается и раскладывается по буквам только при
+    смене employees_signature(); готовые клавиатуры (алфавит и страницы по
+    EMPLOYEE_PAGE_SIZE человек) строятся один раз и переиспользуются, поэтому
+    размер клавиатуры и стоимость ее построения не зависят от числа сотрудников.
+    """
+
+    def __init__(self, page_size: int = EMPLOYEE_PAGE_SIZE):
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._signature = None
+        self._stale = True
+        self._employees = []
+        self._buckets = {}
+        self._keyboards = {}
+
+    def notify_changed(self):
+        """Помечает кэш устаревшим (например, после правки списка вне save_employees)"""
+        self._stale = True
+
+    def _ensure_fresh(self):
+        signature = employees_signature()
+        if not self._stale and signature == self._signature:
+            return
+        with self._lock:
+            if not self._stale and signature == self._signature:
+                return
+            employees = sorted(load_employees(), key=sort_key)
+            buckets = {}
+            for employee in employees:
+                buckets.setdefault(bucket_of(employee), []).append(employee)
+            self._employees = employees
+            self._buckets = dict(sorted(buckets.items(), key=lambda item: (item[0] == OTHER_BUCKET, item[0])))
+            self._keyboards = {}
+            self._signature = signature
+            self._stale = False
+            logger.debug("Кэш клавиатур сотрудников обновлен: %s сотрудников, %s разделов",
+                         len(employees), len(self._buckets))
+
+    def _cached(self, key, build) -> InlineKeyboardMarkup:
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = self._keyboards[key] = build()
+        return keyboard
+
+    def root(self) -> InlineKeyboardMarkup:
+        """Первый экран выбора: весь список, если он короткий, иначе алфавит"""
+        self._ensure_fresh()
+        if len(self._employees) <= self.page_size:
+            return self._cached('all', lambda: self._employee_rows(self._employees, []))
+        return self._cached('letters', self._build_letters)
+
+    def page(self, bucket: str, page: int = 0) -> InlineKeyboardMarkup:
+        """Страница сотрудников на букву bucket; неизвестная буква — возврат к алфавиту"""
+        self._ensure_fresh()
+        employees = self._buckets.get(bucket)
+        if not employees:
+            return self.root()
+        pages = (len(employees) + self.page_size - 1) // self.page_size
+        page = min(page, pages - 1)
+        return self._cached((bucket, page), lambda: self._build_page(bucket, employees, page, pages))
+
+    def _build_letters(self) -> InlineKeyboardMarkup:
+        buttons = [
+            InlineKeyboardButton(text=f"{bucket} ({len(employees)})", callback_data=page_callback(bucket))
+            for bucket, employees in self._buckets.items()
+        ]
+        rows = [buttons[i:i + LETTER_COLUMNS] for i in range(0, len(buttons), LETTER_COLUMNS)]
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    def _build_page(self, bucket: str, employees: list, page: int, pages: int) -> InlineKeyboardMarkup:
+        start = page * self.page_size
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton(text="‹", callback_data=page_callback(bucket, page - 1)))
+        if pages > 1:
+            navigation.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="noop"))
+        if page < pages - 1:
+            navigation.append(InlineKeyboardButton(text="›", callback_data=page_callback(bucket, page + 1)))
+        footer = [navigation] if navigation else []
+        footer.append([InlineKeyboardButton(text="« К алфавиту", callback_data=page_callback())])
+        return self._employee_rows(employees[start:start + self.page_size], footer)
+
+    @staticmethod
+    def _employee_rows(employees: list, footer: list) -> InlineKeyboardMarkup:
+        rows = [[InlineKeyboardButton(text=employee, callback_data=f"select_employee:{employee}")]
+                for employee in employees]
+        return InlineKeyboardMarkup(inline_keyboard=rows + footer)
+
+employee_keyboards = EmployeeKeyboards()